@@ -0,0 +1,128 @@
+import json
+import os
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from peewee import fn
+
+from backend.models import db, Date, IngestionLedger
+from backend.settings import COLUMNAR_CACHE_DIR
+
+
+class ColumnarCache:
+    caches = {}
+
+    def __init__(self, fact_model):
+        self.fact_model = fact_model
+        table_name = fact_model._meta.table_name
+        self.array_path = os.path.join(COLUMNAR_CACHE_DIR, f'{table_name}.npy')
+        self.meta_path = os.path.join(COLUMNAR_CACHE_DIR, f'{table_name}.json')
+        self.meta_mtime = None
+        self.meta = None
+        self.array = None
+
+    @classmethod
+    def of(cls, fact_model) -> 'ColumnarCache':
+        if fact_model not in cls.caches:
+            cls.caches[fact_model] = cls(fact_model=fact_model)
+        return cls.caches[fact_model]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(COLUMNAR_CACHE_DIR) and np is not None
+
+    def get_rows(self, start_date: str, end_date: str):
+        if not self.enabled or not self.__load():
+            return None
+        if self.meta['version'] != IngestionLedger().get_version(report=self.fact_model.__name__):
+            return None
+        first_day = date.fromisoformat(self.meta['first_day'])
+        start = max((date.fromisoformat(f'{start_date}') - first_day).days, 0)
+        end = min((date.fromisoformat(f'{end_date}') - first_day).days + 1, len(self.array))
+        if start >= end:
+            return []
+        totals = self.array[start:end].sum(axis=0)
+        members = self.meta['members']
+        # dimension members sharing the member columns (cities geocoded by name and country)
+        # are one row, as in the grouped SQL of the fact model
+        totals_by_member = {}
+        for dimension_id in np.flatnonzero(totals):
+            member = tuple(members[f'{dimension_id}'])
+            totals_by_member[member] = totals_by_member.get(member, 0) + int(totals[dimension_id])
+        return sorted((*member, total) for member, total in totals_by_member.items())
+
+    def update(self, dates: list):
+        if not self.enabled or Date().min_date is None:
+            return
+        os.makedirs(COLUMNAR_CACHE_DIR, exist_ok=True)
+        first_day = date.fromisoformat(f'{Date().min_date}')
+        count_days = (date.fromisoformat(f'{Date().max_date}') - first_day).days + 1
+        members = self.__get_members()
+        shape = (count_days, max(map(int, members), default=0) + 1)
+
+        array = np.lib.format.open_memmap(f'{self.array_path}.tmp', mode='w+',
+                                          dtype=np.int64, shape=shape)
+        if not self.__copy_previous(array=array, first_day=first_day):
+            dates = [row.date for row in Date.select(Date.date)]
+        day_by_key = {Date.get_key(date_work): (date.fromisoformat(f'{date_work}') - first_day).days
+                      for date_work in dates}
+        array[list(day_by_key.values())] = 0
+        date_id, dimension, metric = self.fact_model().fields_without_id
+        query = self.fact_model.select(date_id, dimension, fn.SUM(metric)).\
+            where(date_id.in_(list(day_by_key))).group_by(date_id, dimension)
+        for key, dimension_id, value in db.execute(query):
+            array[day_by_key[key], dimension_id] = value
+        array.flush()
+        del array
+        os.replace(f'{self.array_path}.tmp', self.array_path)
+        self.__write_meta(meta={
+            'version': IngestionLedger().get_version(report=self.fact_model.__name__),
+            'first_day': f'{first_day}',
+            'members': members,
+        })
+
+    def __get_members(self) -> dict:
+        dimension_model = self.fact_model.dimension_model
+        query = dimension_model.select(
+            dimension_model._meta.primary_key,
+            *[dimension_model._meta.columns[column] for column in self.fact_model.member_columns]
+        )
+        return {f'{dimension_id}': member for dimension_id, *member in db.execute(query)}
+
+    def __copy_previous(self, array, first_day: date) -> bool:
+        previous_meta = self.__read_meta()
+        if previous_meta is None or not os.path.exists(self.array_path):
+            return False
+        previous = np.load(self.array_path, mmap_mode='r')
+        offset = (date.fromisoformat(previous_meta['first_day']) - first_day).days
+        count_days, count_members = previous.shape
+        if offset < 0 or offset + count_days > array.shape[0] or count_members > array.shape[1]:
+            return False
+        array[offset:offset + count_days, :count_members] = previous
+        return True
+
+    def __load(self) -> bool:
+        try:
+            meta_mtime = os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if meta_mtime != self.meta_mtime:
+            self.meta = self.__read_meta()
+            self.array = np.load(self.array_path, mmap_mode='r')
+            self.meta_mtime = meta_mtime
+        return True
+
+    def __read_meta(self):
+        try:
+            with open(self.meta_path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def __write_meta(self, meta: dict):
+        with open(f'{self.meta_path}.tmp', 'w') as file:
+            json.dump(meta, file)
+        os.replace(f'{self.meta_path}.tmp', self.meta_path)
@@ -0,0 +1,29 @@
+from signal import signal, SIGINT, SIGTERM
+from threading import Event
+from time import monotonic
+
+from backend.main import Worker
+from backend.settings import REFRESH_INTERVAL_SECONDS
+
+
+class IngestionDaemon:
+    def __init__(self, interval: int = REFRESH_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stopped = Event()
+
+    def run(self):
+        signal(SIGINT, self.__stop)
+        signal(SIGTERM, self.__stop)
+        next_run_at = monotonic()
+        while not self.stopped.wait(max(next_run_at - monotonic(), 0)):
+            self.__refresh()
+            while next_run_at <= monotonic():
+                next_run_at += self.interval
+
+    def __refresh(self):
+        Worker().finalize()
+        Worker().refresh()
+
+    def __stop(self, signum, frame):
+        print('Ingestion daemon is stopping')
+        self.stopped.set()
@@ -1,10 +1,18 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import date, timedelta
 from importlib import import_module
+from time import perf_counter
+from types import MappingProxyType
 
-from backend.models import Date
-from backend.request_handlers.requester import Requester
+from backend.models import db, Date, DimensionResolver, IngestionLedger, get_retention_cutoff
+from backend.request_handlers.rate_limiter import TokenBucket
+from backend.request_handlers.reports_fetcher import ReportsFetcher
+from backend.request_handlers.requester import Requester, RequestFailed
+from backend.result_cache import bump_data_version
 
-from backend.settings import URL, HEADER, QUERY, CASES_OF_MODEL_QUERY
+from backend.settings import QUERY, CASES_OF_MODEL_QUERY, DATE_DIMENSION, BACKFILL_DAYS_PER_TASK, \
+    METRICA_REQUESTS_PER_SECOND
 
 
 class DeltaDaysIsNotInt(Exception):
@@ -12,56 +20,254 @@ class DeltaDaysIsNotInt(Exception):
         return "Parameter 'delta_days' must be integer!"
 
 
-class Worker:
-    QUERY = QUERY
+def split_by_date(metric_data: list) -> dict:
+    metric_data_by_date = defaultdict(list)
+    for item in metric_data:
+        date_dimension, *dimensions = item['dimensions']
+        metric_data_by_date[date_dimension['name']].append({**item, 'dimensions': dimensions})
+    return metric_data_by_date
+
+
+def init_fetch_process(processes: int):
+    Requester.rate_limiter = TokenBucket(rate=METRICA_REQUESTS_PER_SECOND / processes)
+
 
+def fetch_metric_data(queries: dict) -> (dict, dict):
+    metric_data, errors = {}, {}
+    for name_model, page in ReportsFetcher(queries=queries):
+        if isinstance(page, Exception):
+            errors[name_model] = str(page)
+            metric_data.pop(name_model, None)
+        elif page:
+            metric_data_by_date = metric_data.setdefault(name_model, {})
+            for date_work, metric_data_of_date in split_by_date(metric_data=page).items():
+                metric_data_by_date.setdefault(date_work, []).extend(metric_data_of_date)
+        else:
+            metric_data.setdefault(name_model, {})
+    return metric_data, errors
+
+
+class Worker:
     def __init__(self):
-        self.date_work = None
-        self.date_id = 0
+        self.date_ids = {}
+        self.pending_reports = {}
+        self.rows_count = defaultdict(int)
+        self.failed_reports = set()
+        self.write_stats = defaultdict(lambda: [0, 0.0])
 
     def run(self, delta_days: int = 1):
         try:
             self.__checking_delta_days(delta_days=delta_days)
+            DimensionResolver.reset()
             for i in range(delta_days, 0, -1):
-                self.__init_params(delta_days=i)
-                self.__insert_metric_data_to_db()
+                self.__insert_metric_data_to_db(dates=[date.today() - timedelta(days=i)])
+            self.compact()
+        except Exception as exc:
+            print(exc)
+
+    def backfill(self, delta_days: int = 1, processes: int = 1):
+        try:
+            self.__checking_delta_days(delta_days=delta_days)
+            DimensionResolver.reset()
+            dates = [date.today() - timedelta(days=i) for i in range(delta_days, 0, -1)]
+            if processes > 1:
+                self.__insert_metric_data_to_db_in_processes(dates=dates, processes=processes)
+            else:
+                self.__insert_metric_data_to_db(dates=dates)
+            self.compact()
+        except Exception as exc:
+            print(exc)
+
+    def finalize(self):
+        try:
+            DimensionResolver.reset()
+            unfinished_dates = IngestionLedger().get_unfinished_dates(
+                reports=list(CASES_OF_MODEL_QUERY), end_date=date.today()
+            )
+            for date_work in unfinished_dates:
+                self.__insert_metric_data_to_db(dates=[date_work])
+            self.compact()
+        except Exception as exc:
+            print(exc)
+
+    def refresh(self, date_work: date = None):
+        try:
+            DimensionResolver.reset()
+            with db.atomic() as transaction:
+                self.__insert_metric_data_to_db(dates=[date_work or date.today()], force=True)
+                if self.failed_reports:
+                    transaction.rollback()
+                    print('Refresh is rolled back, previous data is kept')
+            bump_data_version()
         except Exception as exc:
             print(exc)
-            self.__del_bad_inserted_data()
+        finally:
+            DimensionResolver.reset()
+
+    def compact(self):
+        cutoff = get_retention_cutoff()
+        if cutoff is None:
+            return
+        count_compacted_days = 0
+        for name_model in CASES_OF_MODEL_QUERY:
+            class_model = self.__get_class_model(name_model=name_model)
+            compacted_dates = class_model().compact(cutoff=cutoff)
+            if compacted_dates:
+                for storage in class_model.get_storages():
+                    storage.update(dates=compacted_dates)
+            count_compacted_days += len(compacted_dates)
+        if count_compacted_days:
+            bump_data_version()
+            db.execute_sql('VACUUM')
+            print(f'Daily rows before {cutoff} are compacted by months ({count_compacted_days} days)')
 
     @staticmethod
     def __checking_delta_days(delta_days: int):
         if not isinstance(delta_days, int):
             raise DeltaDaysIsNotInt()
 
-    def __init_params(self, delta_days: int = 1):
-        self.date_work = date.today() - timedelta(days=delta_days)
-        query_date = {
-            'date1': f'{self.date_work}',
-            'date2': f'{self.date_work}',
-        }
-        self.QUERY.update(query_date)
-        self.date_id = Date.get_or_create(date=self.date_work)
-        if not self.date_id[1]:
-            exit(print('Такая дата уже есть в БД!'))
-        else:
-            self.date_id = self.date_id[0]
-
-    def __insert_metric_data_to_db(self):
-        for name_model, query in CASES_OF_MODEL_QUERY.items():
-            self.QUERY.update(query)
-            class_model = getattr(import_module('backend.models'), name_model)
-            for item in self.__get_data_from_metric:
-                class_model().add_metric_row(date_id=self.date_id, metric_data=item)
-
-    @property
-    def __get_data_from_metric(self) -> list:
-        response = Requester().get(url=URL, params=QUERY, headers=HEADER)
-        return response['data']
-
-    def __del_bad_inserted_data(self):
-        if self.date_work:
-            if not self.date_id:
-                self.date_id = Date().get_id_value(name_column='date',
-                                                   value=str(self.date_work))
-            Date.delete().where(Date.id == self.date_id).execute()
+    def __init_params(self, dates: list, force: bool = False):
+        self.date_ids = Date().get_ids(dates=dates)
+        finished_reports = set() if force else IngestionLedger().get_finished_reports(
+            date_ids=list(self.date_ids.values())
+        )
+        self.pending_reports = {}
+        for name_model in CASES_OF_MODEL_QUERY:
+            pending_date_ids = {
+                date_work: date_id for date_work, date_id in self.date_ids.items()
+                if (date_id, name_model) not in finished_reports
+            }
+            if pending_date_ids:
+                self.pending_reports[name_model] = pending_date_ids
+        self.rows_count.clear()
+        self.failed_reports.clear()
+
+    def __get_queries(self, date_works: list) -> dict:
+        queries = {}
+        for name_model, pending_date_ids in self.pending_reports.items():
+            pending_date_works = [d for d in date_works if d in pending_date_ids]
+            if not pending_date_works:
+                continue
+            query = CASES_OF_MODEL_QUERY[name_model]
+            queries[name_model] = MappingProxyType({
+                **QUERY, **query,
+                'dimensions': f"{DATE_DIMENSION},{query['dimensions']}",
+                'date1': min(pending_date_works),
+                'date2': max(pending_date_works),
+            })
+        return queries
+
+    def __insert_metric_data_to_db(self, dates: list, force: bool = False):
+        self.__init_params(dates=dates, force=force)
+        if not self.pending_reports:
+            print(f'Dates {dates[0]} - {dates[-1]} are already loaded')
+            return
+        for name_model in self.pending_reports:
+            self.__del_pending_metric_rows(name_model=name_model)
+        queries = self.__get_queries(date_works=list(self.date_ids))
+        for name_model, page in ReportsFetcher(queries=queries):
+            if name_model in self.failed_reports:
+                continue
+            if page is not None and not isinstance(page, Exception):
+                try:
+                    self.__write_metric_data(name_model=name_model,
+                                             metric_data_by_date=split_by_date(metric_data=page))
+                except RequestFailed as exc:
+                    page = exc
+            if isinstance(page, Exception):
+                print(f'{name_model} is not loaded, it will be retried on the next run: {page}')
+                self.failed_reports.add(name_model)
+                self.__del_pending_metric_rows(name_model=name_model)
+            elif page is None:
+                self.__finish_report(name_model=name_model, date_works=list(self.date_ids))
+        self.__print_write_stats()
+
+    def __insert_metric_data_to_db_in_processes(self, dates: list, processes: int):
+        self.__init_params(dates=dates)
+        if not self.pending_reports:
+            print(f'Dates {dates[0]} - {dates[-1]} are already loaded')
+            return
+        for name_model in self.pending_reports:
+            self.__del_pending_metric_rows(name_model=name_model)
+        date_works = list(self.date_ids)
+        chunks = [date_works[i:i + BACKFILL_DAYS_PER_TASK]
+                  for i in range(0, len(date_works), BACKFILL_DAYS_PER_TASK)]
+        count_loaded_days = 0
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_fetch_process,
+                                 initargs=(processes,)) as executor:
+            futures = {}
+            for chunk in chunks:
+                queries = {name_model: dict(params)
+                           for name_model, params in self.__get_queries(date_works=chunk).items()}
+                if queries:
+                    futures[executor.submit(fetch_metric_data, queries=queries)] = chunk
+            count_days = sum(len(chunk) for chunk in futures.values())
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    metric_data, errors = future.result()
+                except Exception as exc:
+                    metric_data, errors = {}, {'all reports': str(exc)}
+                for name_model, metric_data_by_date in metric_data.items():
+                    try:
+                        self.__write_metric_data(name_model=name_model,
+                                                 metric_data_by_date=metric_data_by_date)
+                    except RequestFailed as exc:
+                        errors[name_model] = str(exc)
+                        self.__del_pending_metric_rows(name_model=name_model, date_works=chunk)
+                        continue
+                    self.__finish_report(name_model=name_model, date_works=chunk)
+                for name_model, error in errors.items():
+                    print(f'{chunk[0]} - {chunk[-1]}: {name_model} is not loaded, '
+                          f'it will be retried on the next run: {error}')
+                for date_work in chunk:
+                    count_loaded_days += 1
+                    status = 'loaded' if not errors else 'loaded partially'
+                    print(f'{date_work} {status} ({count_loaded_days}/{count_days} days)')
+        self.__print_write_stats()
+
+    @staticmethod
+    def __get_class_model(name_model: str):
+        return getattr(import_module('backend.models'), name_model)
+
+    def __del_pending_metric_rows(self, name_model: str, date_works: list = None):
+        pending_date_ids = self.pending_reports[name_model]
+        self.__get_class_model(name_model=name_model)().delete_metric_rows(date_ids=[
+            date_id for date_work, date_id in pending_date_ids.items()
+            if date_works is None or date_work in date_works
+        ])
+
+    def __write_metric_data(self, name_model: str, metric_data_by_date: dict):
+        class_model = self.__get_class_model(name_model=name_model)
+        pending_date_ids = self.pending_reports[name_model]
+        start = perf_counter()
+        for date_work, metric_data_of_date in metric_data_by_date.items():
+            if date_work not in pending_date_ids:
+                continue
+            date_id = pending_date_ids[date_work]
+            count_rows = class_model().add_metric_rows(date_id=date_id,
+                                                       metric_data=metric_data_of_date)
+            self.rows_count[(date_id, name_model)] += count_rows
+            self.write_stats[name_model][0] += count_rows
+        self.write_stats[name_model][1] += perf_counter() - start
+
+    def __finish_report(self, name_model: str, date_works: list):
+        pending_date_ids = self.pending_reports[name_model]
+        date_works = [date_work for date_work in date_works if date_work in pending_date_ids]
+        class_model = self.__get_class_model(name_model=name_model)
+        with db.atomic():
+            class_model().update_rollups(dates=date_works)
+            class_model().update_cumulative(dates=date_works)
+            IngestionLedger().finish_reports(report=name_model, rows_count_by_date_id={
+                date_id: self.rows_count[(date_id, name_model)]
+                for date_id in [pending_date_ids[date_work] for date_work in date_works]
+            })
+        for storage in class_model.get_storages():
+            storage.update(dates=date_works)
+        bump_data_version()
+
+    def __print_write_stats(self):
+        for name_model, (count_rows, seconds) in self.write_stats.items():
+            rows_per_sec = count_rows / seconds if seconds else count_rows
+            print(f'{name_model}: {count_rows} rows, {rows_per_sec:.0f} rows/sec')
+        self.write_stats.clear()
@@ -0,0 +1,73 @@
+from backend.models import db, cases_of_fact_models
+
+
+def add_covering_indexes():
+    for fact_model in cases_of_fact_models:
+        date_id, dimension, metric = fact_model().fields_without_id
+        db.execute(fact_model.index(
+            date_id, dimension, metric,
+            name=f'{fact_model._meta.table_name}_covering'
+        ))
+        rollup_model = fact_model.rollup_model
+        grain, period_start, dimension, metric = rollup_model().fields_without_id
+        db.execute(rollup_model.index(
+            grain, period_start, dimension, metric,
+            name=f'{rollup_model._meta.table_name}_covering'
+        ))
+
+
+def rekey_dates_by_calendar():
+    from backend.models import Date, IngestionLedger
+
+    db.pragma('defer_foreign_keys', 'on')
+    calendar_key = "CAST(strftime('%Y%m%d', date) AS INTEGER)"
+    for model in [IngestionLedger, *cases_of_fact_models]:
+        db.execute_sql(
+            f'UPDATE {model._meta.table_name} SET date_id = '
+            f'(SELECT {calendar_key} FROM date WHERE date.id = {model._meta.table_name}.date_id)'
+        )
+    db.execute_sql(f'UPDATE date SET id = {calendar_key}')
+    dates = [row.date for row in Date.select()]
+    for fact_model in cases_of_fact_models:
+        fact_model().update_rollups(dates=dates)
+        fact_model().update_cumulative(dates=dates)
+
+
+MIGRATIONS = [
+    add_covering_indexes,
+    rekey_dates_by_calendar,
+]
+
+
+def migrate():
+    version = db.pragma('user_version')
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with db.atomic():
+            migration()
+            db.pragma('user_version', number)
+        print(f'DB migrated to version {number}: {migration.__name__}')
+
+
+def explain_query_plan(query) -> list:
+    sql, params = query.sql()
+    return [row[-1] for row in db.execute_sql(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+if __name__ == '__main__':
+    from datetime import date
+
+    from backend.models import Date, init_db
+
+    init_db()
+    print('DB version:', db.pragma('user_version'))
+    start_date, end_date = Date().min_date, Date().max_date
+    if start_date is None:
+        # an empty database has no dates yet, the plan does not depend on the keys
+        start_date = end_date = date.today()
+    for fact_model in cases_of_fact_models:
+        _, dimension, metric = fact_model().fields_without_id
+        print(fact_model.__name__)
+        query = fact_model.select(dimension, metric).\
+            where(fact_model.date_id.between(Date.get_key(start_date), Date.get_key(end_date)))
+        for step in explain_query_plan(query=query):
+            print('   ', step)
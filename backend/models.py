@@ -1,12 +1,33 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import reduce
+from operator import or_
+
 from flask_login import UserMixin
 from flask_peewee.auth import BaseUser
-from peewee import SqliteDatabase, Model, \
-    CharField, ForeignKeyField, DateField, IntegerField, FloatField, BooleanField, fn
+from peewee import SqliteDatabase, Model, CharField, ForeignKeyField, DateField, DateTimeField, \
+    IntegerField, FloatField, BooleanField, Value, Case, EnclosedNodeList, JOIN, fn, chunked
 
-from backend.settings import DB_NAME, ADMIN_DEFAULT_PASSWORD, ADMIN_DEFAULT_EMAIL
+from backend.settings import DB_NAME, ADMIN_DEFAULT_PASSWORD, ADMIN_DEFAULT_EMAIL, INSERT_BATCH_SIZE, \
+    SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_SECONDS, RETENTION_DAYS
 from backend.request_handlers.map_data_requester import MapDataRequester
 
-db = SqliteDatabase(DB_NAME, pragmas={'foreign_keys': 1})
+db = SqliteDatabase(DB_NAME, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, pragmas={
+    'foreign_keys': 1,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -SQLITE_CACHE_SIZE_KB,
+    'mmap_size': SQLITE_MMAP_SIZE,
+})
+
+
+@contextmanager
+def read_only():
+    db.pragma('query_only', 1)
+    try:
+        yield
+    finally:
+        db.pragma('query_only', 0)
 
 
 def make_table_name(model_class: Model) -> str:
@@ -15,35 +36,330 @@ def make_table_name(model_class: Model) -> str:
     return ''.join(table_name).lower()
 
 
+def get_month_end(date_work: date) -> date:
+    next_month = (date_work.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def get_rollup_periods(date_work: date) -> list:
+    week_start = date_work - timedelta(days=date_work.weekday())
+    month_start = date_work.replace(day=1)
+    return [
+        ('week', week_start, week_start + timedelta(days=6)),
+        ('month', month_start, get_month_end(month_start)),
+    ]
+
+
+def plan_date_range(start_date: date, end_date: date) -> dict:
+    plan = {'month': [], 'week': [], 'day': []}
+    segments = []
+    segment_start = start_date
+    month_start = start_date if start_date.day == 1 \
+        else get_month_end(start_date) + timedelta(days=1)
+    while get_month_end(month_start) <= end_date:
+        plan['month'].append(month_start)
+        if segment_start < month_start:
+            segments.append((segment_start, month_start - timedelta(days=1)))
+        segment_start = month_start = get_month_end(month_start) + timedelta(days=1)
+    if segment_start <= end_date:
+        segments.append((segment_start, end_date))
+
+    for segment_start, segment_end in segments:
+        day_start = segment_start
+        week_start = segment_start + timedelta(days=-segment_start.weekday() % 7)
+        while week_start + timedelta(days=6) <= segment_end:
+            plan['week'].append(week_start)
+            if day_start < week_start:
+                plan['day'].append((day_start, week_start - timedelta(days=1)))
+            day_start = week_start = week_start + timedelta(days=7)
+        if day_start <= segment_end:
+            plan['day'].append((day_start, segment_end))
+    return plan
+
+
+def get_retention_cutoff():
+    if not RETENTION_DAYS:
+        return None
+    return (date.today() - timedelta(days=RETENTION_DAYS)).replace(day=1)
+
+
+def snap_range_to_retention(start_date: str, end_date: str) -> tuple:
+    cutoff = get_retention_cutoff()
+    start_date, end_date = date.fromisoformat(f'{start_date}'), date.fromisoformat(f'{end_date}')
+    if cutoff is not None and start_date < cutoff:
+        start_date = start_date.replace(day=1)
+        if end_date < cutoff:
+            end_date = get_month_end(end_date)
+    return f'{start_date}', f'{end_date}'
+
+
 class BaseModel(Model):
+    dimension_model = None
+    dimension_key = ''
+
     class Meta:
         database = db
         table_function = make_table_name
 
-    def add_metric_row(self, date_id: int, metric_data: dict):
+    def make_metric_row(self, date_id: int, metric_data: dict) -> tuple:
+        pass
+
+    @property
+    def fields_without_id(self) -> list:
+        return [field for field in self._meta.sorted_fields
+                if field is not self._meta.primary_key]
+
+    @property
+    def dimension_resolver(self) -> 'DimensionResolver':
+        return DimensionResolver.of(model=self.dimension_model, key_column=self.dimension_key)
+
+    def get_dimension_member(self, dimension: dict) -> tuple:
         pass
 
+    def prepare_metric_data(self, metric_data: list):
+        members = dict(self.get_dimension_member(dimension=item['dimensions'][0])
+                       for item in metric_data)
+        self.dimension_resolver.add_members(members=members)
+
+    def delete_metric_rows(self, date_ids: list):
+        with db.atomic():
+            for batch in chunked(date_ids, INSERT_BATCH_SIZE):
+                self.delete().where(self._meta.columns['date_id'].in_(batch)).execute()
+
+    def add_metric_rows(self, date_id: int, metric_data: list) -> int:
+        self.prepare_metric_data(metric_data=metric_data)
+        rows = [self.make_metric_row(date_id=date_id, metric_data=item) for item in metric_data]
+        with db.atomic():
+            for batch in chunked(rows, INSERT_BATCH_SIZE):
+                self.insert_many(batch, fields=self.fields_without_id).execute()
+        return len(rows)
+
     def insert_default_values(self):
         pass
 
 
-class ModelWithTwoId(Model):
+class DimensionResolver:
+    resolvers = {}
+
+    def __init__(self, model: Model, key_column: str):
+        self.model = model
+        self.key_column = model._meta.columns[key_column]
+        query = model.select(model._meta.primary_key, self.key_column)
+        self.ids = {key: dimension_id for dimension_id, key in db.execute(query)}
+
+    @classmethod
+    def of(cls, model: Model, key_column: str) -> 'DimensionResolver':
+        if model not in cls.resolvers:
+            cls.resolvers[model] = cls(model=model, key_column=key_column)
+        return cls.resolvers[model]
+
+    @classmethod
+    def reset(cls):
+        cls.resolvers.clear()
+
+    def __contains__(self, key) -> bool:
+        return key in self.ids
+
+    def __getitem__(self, key) -> int:
+        return self.ids[key]
+
+    def add_members(self, members: dict):
+        new_members = {key: row for key, row in members.items() if key not in self.ids}
+        if not new_members:
+            return
+        with db.atomic():
+            for batch in chunked(new_members.values(), INSERT_BATCH_SIZE):
+                self.model.insert_many(batch, fields=self.model().fields_without_id).\
+                    on_conflict_ignore().execute()
+        for batch in chunked(new_members, INSERT_BATCH_SIZE):
+            condition = self.key_column.in_(batch)
+            if None in batch:
+                condition |= self.key_column.is_null()
+            query = self.model.select(self.model._meta.primary_key, self.key_column).where(condition)
+            self.ids.update({key: dimension_id for dimension_id, key in db.execute(query)})
+
+
+class ModelWithRollups(Model):
+    rollup_model = None
+    cumulative_model = None
+    member_columns = ['name']
+
+    def update_rollups(self, dates: list):
+        date_id, dimension, metric = self.fields_without_id
+        periods = {period for date_work in dates
+                   for period in get_rollup_periods(date_work=date.fromisoformat(f'{date_work}'))}
+        rollup_columns = self.rollup_model._meta.columns
+        with db.atomic():
+            for grain, period_start, period_end in sorted(periods):
+                self.rollup_model.delete().where(
+                    rollup_columns['grain'] == grain,
+                    rollup_columns['period_start'] == f'{period_start}'
+                ).execute()
+                query = self.select(Value(grain), Value(f'{period_start}'),
+                                    dimension, fn.SUM(metric)).\
+                    where(date_id.between(Date.get_key(period_start), Date.get_key(period_end))).\
+                    group_by(dimension)
+                self.rollup_model.insert_from(
+                    query, fields=self.rollup_model().fields_without_id
+                ).execute()
+
+    def update_cumulative(self, dates: list):
+        if self.cumulative_model is None or not dates:
+            return
+        date_id, dimension, metric = self.fields_without_id
+        cumulative_date_id, cumulative_dimension, cumulative_metric = \
+            self.cumulative_model().fields_without_id
+        start_key = min(Date.get_key(date_work) for date_work in dates)
+        with db.atomic():
+            query = self.cumulative_model.select(cumulative_dimension, cumulative_metric).where(
+                cumulative_date_id == self.cumulative_model.select(fn.MAX(cumulative_date_id)).
+                where(cumulative_date_id < start_key)
+            )
+            totals = {dimension_id: total for dimension_id, total in db.execute(query)}
+            metric_by_date_id = {}
+            query = self.select(date_id, dimension, fn.SUM(metric)).\
+                where(date_id >= start_key).group_by(date_id, dimension)
+            for key, dimension_id, value in db.execute(query):
+                metric_by_date_id.setdefault(key, []).append((dimension_id, value))
+            rows = []
+            query = Date.select(Date.id).where(Date.id >= start_key).order_by(Date.id)
+            for key, in db.execute(query):
+                for dimension_id, value in metric_by_date_id.get(key, []):
+                    totals[dimension_id] = totals.get(dimension_id, 0) + value
+                rows.extend((key, dimension_id, total) for dimension_id, total in totals.items())
+            self.cumulative_model.delete().where(cumulative_date_id >= start_key).execute()
+            for batch in chunked(rows, INSERT_BATCH_SIZE):
+                self.cumulative_model.insert_many(
+                    batch, fields=self.cumulative_model().fields_without_id
+                ).execute()
+
+    @classmethod
+    def get_storages(cls) -> list:
+        from backend.columnar_cache import ColumnarCache
+        from backend.parquet_storage import ParquetStorage
+
+        return [ParquetStorage.of(fact_model=cls), ColumnarCache.of(fact_model=cls)]
+
+    def compact(self, cutoff: date) -> list:
+        date_id, dimension, metric = self.fields_without_id
+        query = self.select((date_id / 100).alias('month')).distinct().\
+            where(date_id < Date.get_key(cutoff), date_id != date_id / 100 * 100 + 1)
+        month_starts = sorted(date(month // 100, month % 100, 1) for month, in db.execute(query))
+        compacted_dates = []
+        with db.atomic():
+            for month_start in month_starts:
+                month_end = get_month_end(month_start)
+                month_condition = date_id.between(Date.get_key(month_start), Date.get_key(month_end))
+                query = self.select(dimension, fn.SUM(metric)).where(month_condition).\
+                    group_by(dimension)
+                rows = [(Date.get_key(month_start), dimension_id, total)
+                        for dimension_id, total in db.execute(query)]
+                self.delete().where(month_condition).execute()
+                # the month total sits on the key of the 1st, no day of the month may be
+                # reloaded over it, so every day of the month counts as loaded
+                month_dates = [month_start + timedelta(days=i) for i in range(month_end.day)]
+                date_ids = Date().get_ids(dates=month_dates)
+                report = type(self).__name__
+                finished_reports = IngestionLedger().get_finished_reports(
+                    date_ids=list(date_ids.values())
+                )
+                IngestionLedger().finish_reports(report=report, rows_count_by_date_id={
+                    key: 0 for key in date_ids.values() if (key, report) not in finished_reports
+                })
+                for batch in chunked(rows, INSERT_BATCH_SIZE):
+                    self.insert_many(batch, fields=self.fields_without_id).execute()
+                compacted_dates.extend(month_dates)
+            if month_starts:
+                rollup_columns = self.rollup_model._meta.columns
+                self.rollup_model.delete().where(
+                    rollup_columns['grain'] == 'week',
+                    rollup_columns['period_start'] < f'{cutoff}'
+                ).execute()
+                self.update_cumulative(dates=month_starts)
+        return compacted_dates
+
+    def get_stored_rows(self, start_date: str, end_date: str):
+        for storage in self.get_storages():
+            rows = storage.get_rows(start_date=start_date, end_date=end_date)
+            if rows is not None:
+                return rows
+        return None
+
+    def select_range_totals(self, start_date: str, end_date: str):
+        date_id, dimension, metric = self.cumulative_model().fields_without_id
+        start_key, end_key = Date.get_key(start_date), Date.get_key(end_date)
+        # scalar subqueries, enclosed as peewee does not parenthesize them inside CASE
+        last_end = EnclosedNodeList([
+            self.cumulative_model.select(fn.MAX(date_id)).where(date_id <= end_key)
+        ])
+        last_before_start = EnclosedNodeList([
+            self.cumulative_model.select(fn.MAX(date_id)).where(date_id < start_key)
+        ])
+        total = fn.SUM(Case(None, [(date_id == last_end, metric)], 0)) - \
+            fn.SUM(Case(None, [(date_id == last_before_start, metric)], 0))
+        return self.cumulative_model.select(dimension.alias('dimension_id'), total.alias('metric')).\
+            where((date_id == last_end) | (date_id == last_before_start)).\
+            group_by(dimension).having(total != 0).alias('totals')
+
+    def select_range_pieces(self, start_date: str, end_date: str):
+        date_id, dimension, metric = self.fields_without_id
+        rollup_columns = self.rollup_model._meta.columns
+        plan = plan_date_range(start_date=date.fromisoformat(f'{start_date}'),
+                               end_date=date.fromisoformat(f'{end_date}'))
+        pieces = []
+        if plan['day']:
+            pieces.append(
+                self.select(dimension.alias('dimension_id'), metric.alias('metric')).
+                where(reduce(or_, [date_id.between(Date.get_key(day_start), Date.get_key(day_end))
+                                   for day_start, day_end in plan['day']]))
+            )
+        for grain in ['week', 'month']:
+            if plan[grain]:
+                pieces.append(
+                    self.rollup_model.select(
+                        rollup_columns[dimension.column_name].alias('dimension_id'),
+                        rollup_columns[metric.column_name].alias('metric')
+                    ).where(
+                        rollup_columns['grain'] == grain,
+                        rollup_columns['period_start'].in_([f'{d}' for d in plan[grain]])
+                    )
+                )
+        if not pieces:
+            pieces.append(self.select(dimension.alias('dimension_id'), metric.alias('metric')).
+                          where(False))
+        return reduce(lambda union, piece: union + piece, pieces).alias('pieces')
+
+
+class ModelWithTwoId(ModelWithRollups):
     def get_data_from_joining_models(self, start_date: str, end_date: str, select_name_column: str,
                                      order_name_column: str, model) -> list:
-        start_date_id = Date().get(date=start_date)
-        end_date_id = Date().get(date=end_date)
-        query = self.select(model.name, fn.SUM(self._meta.columns[select_name_column])).\
-            join(model, on=self._meta.columns[order_name_column] == model.id).\
-            where(
-                self._meta.columns['date_id'] >= start_date_id,
-                self._meta.columns['date_id'] <= end_date_id
-            ).group_by(model.name).tuples()
+        start_date, end_date = snap_range_to_retention(start_date=start_date, end_date=end_date)
+        rows = self.get_stored_rows(start_date=start_date, end_date=end_date)
+        if rows is not None:
+            return rows
+        if self.cumulative_model is not None:
+            totals = self.select_range_totals(start_date=start_date, end_date=end_date)
+            query = model.select(model.name, totals.c.metric).\
+                join(totals, on=totals.c.dimension_id == model.id).\
+                order_by(model.name).tuples()
+            rows = [row for row in query]
+            if rows:
+                return rows
+        pieces = self.select_range_pieces(start_date=start_date, end_date=end_date)
+        query = model.select(model.name, fn.SUM(pieces.c.metric)).\
+            join(pieces, on=pieces.c.dimension_id == model.id).\
+            group_by(model.name).tuples()
         return [row for row in query]
 
 
 class Date(BaseModel):
+    id = IntegerField(primary_key=True)
     date = DateField(formats='%Y-%m-%d', unique=True)
 
+    @staticmethod
+    def get_key(date_work) -> int:
+        return int(f'{date_work}'.replace('-', ''))
+
     @property
     def min_date(self) -> str:
         query = self.select(self._meta.columns['date']).\
@@ -58,6 +374,73 @@ class Date(BaseModel):
         for row in query:
             return row.date
 
+    def get_ids(self, dates: list) -> dict:
+        rows = [(self.get_key(date_work), f'{date_work}') for date_work in dates]
+        with db.atomic():
+            for batch in chunked(rows, INSERT_BATCH_SIZE):
+                self.insert_many(batch, fields=[self._meta.primary_key, self._meta.columns['date']]).\
+                    on_conflict_ignore().execute()
+        return {date_work: key for key, date_work in sorted(rows)}
+
+
+class IngestionLedger(BaseModel):
+    date_id = ForeignKeyField(model=Date, field=Date.id, on_delete='CASCADE')
+    report = CharField(max_length=30)
+    rows_count = IntegerField()
+    finished_at = DateTimeField()
+
+    class Meta:
+        indexes = ((('date_id', 'report'), True),)
+
+    def get_finished_reports(self, date_ids: list) -> set:
+        finished_reports = set()
+        for batch in chunked(date_ids, INSERT_BATCH_SIZE):
+            query = self.select(self._meta.columns['date_id'], self._meta.columns['report']).\
+                join(Date, on=self._meta.columns['date_id'] == Date.id).\
+                where(
+                    self._meta.columns['date_id'].in_(batch),
+                    fn.DATE(self._meta.columns['finished_at']) > Date.date
+                ).tuples()
+            finished_reports.update(query)
+        return finished_reports
+
+    def get_unfinished_dates(self, reports: list, end_date: date) -> list:
+        columns = self._meta.columns
+        count_finished = fn.COUNT(fn.DISTINCT(Case(None, [
+            (fn.DATE(columns['finished_at']) > Date.date, columns['report'])
+        ])))
+        query = Date.select(Date.date, count_finished).\
+            join(type(self), JOIN.LEFT_OUTER,
+                 on=(columns['date_id'] == Date.id) & columns['report'].in_(reports)).\
+            where(Date.date < f'{end_date}').group_by(Date.id).order_by(Date.id).tuples()
+        unfinished_dates, last_finished_date = [], None
+        for date_work, count_finished_reports in query:
+            date_work = date.fromisoformat(f'{date_work}')
+            if count_finished_reports < len(reports):
+                unfinished_dates.append(date_work)
+            else:
+                last_finished_date = date_work
+        # days after the last finished one may have no rows at all, e.g. the daemon was down
+        first_missing_date = last_finished_date + timedelta(days=1) if last_finished_date \
+            else end_date - timedelta(days=1)
+        missing_dates = [first_missing_date + timedelta(days=i)
+                         for i in range((end_date - first_missing_date).days)]
+        return sorted(set(unfinished_dates) | set(missing_dates))
+
+    def finish_reports(self, report: str, rows_count_by_date_id: dict):
+        finished_at = datetime.now()
+        rows = [(date_id, report, rows_count, finished_at)
+                for date_id, rows_count in rows_count_by_date_id.items()]
+        with db.atomic():
+            for batch in chunked(rows, INSERT_BATCH_SIZE):
+                self.insert_many(batch, fields=self.fields_without_id).on_conflict_replace().execute()
+
+    def get_version(self, report: str) -> str:
+        query = self.select(fn.COUNT(), fn.MAX(self._meta.columns['finished_at'])).\
+            where(self._meta.columns['report'] == report)
+        count_rows, finished_at = next(iter(db.execute(query)))
+        return f'{count_rows}/{finished_at}'
+
 
 class HoursInDay(BaseModel):
     name = DateField(formats='%H:%M:%S', unique=True)
@@ -72,6 +455,29 @@ class HoursInDay(BaseModel):
         return [row.name for row in query]
 
 
+class VisitsCountByHourRollup(BaseModel):
+    grain = CharField(max_length=5)
+    period_start = DateField(formats='%Y-%m-%d')
+    hour_id = ForeignKeyField(
+        model=HoursInDay, field=HoursInDay.id, on_delete='CASCADE'
+    )
+    visits_count_by_hour = IntegerField()
+
+    class Meta:
+        indexes = ((('grain', 'period_start', 'hour_id'), True),)
+
+
+class VisitsCountByHourCumulative(BaseModel):
+    date_id = ForeignKeyField(model=Date, field=Date.id, on_delete='CASCADE')
+    hour_id = ForeignKeyField(
+        model=HoursInDay, field=HoursInDay.id, on_delete='CASCADE'
+    )
+    visits_count_by_hour = IntegerField()
+
+    class Meta:
+        indexes = ((('date_id', 'hour_id'), True),)
+
+
 class VisitsCountByHour(BaseModel, ModelWithTwoId):
     date_id = ForeignKeyField(model=Date, field=Date.id, on_delete='CASCADE')
     hour_id = ForeignKeyField(
@@ -79,15 +485,20 @@ class VisitsCountByHour(BaseModel, ModelWithTwoId):
     )
     visits_count_by_hour = IntegerField()
 
-    def add_metric_row(self, date_id: int, metric_data: dict):
-        hour = metric_data['dimensions'][0]['name'].split(' ')[1],
+    dimension_model = HoursInDay
+    dimension_key = 'name'
+    rollup_model = VisitsCountByHourRollup
+    cumulative_model = VisitsCountByHourCumulative
+
+    def get_dimension_member(self, dimension: dict) -> tuple:
+        hour = dimension['name'].split(' ')[1]
+        return hour, (hour,)
+
+    def make_metric_row(self, date_id: int, metric_data: dict) -> tuple:
+        hour = metric_data['dimensions'][0]['name'].split(' ')[1]
         visits_count_by_hour = metric_data['metrics'][0]
-        hour_id = HoursInDay().get(name=hour)
-        self.insert(
-            date_id=date_id,
-            hour_id=hour_id,
-            visits_count_by_hour=visits_count_by_hour
-        ).execute()
+        hour_id = self.dimension_resolver[hour]
+        return date_id, hour_id, visits_count_by_hour
 
 
 class Cities(BaseModel):
@@ -98,42 +509,95 @@ class Cities(BaseModel):
     long = FloatField()
 
 
-class RegionsMap(BaseModel):
+class GeocodingCache(BaseModel):
+    name = CharField(max_length=50)
+    country_code = CharField(max_length=2)
+    code_country = CharField(max_length=2)
+    lat = FloatField()
+    long = FloatField()
+
+    class Meta:
+        indexes = ((('name', 'country_code'), True),)
+
+    def get_map_params(self, cities: set) -> dict:
+        map_params = {}
+        names = list({name for name, _ in cities})
+        for batch in chunked(names, INSERT_BATCH_SIZE):
+            query = self.select().where(self._meta.columns['name'].in_(batch))
+            for row in query:
+                if (row.name, row.country_code) in cities:
+                    map_params[(row.name, row.country_code)] = [row.long, row.lat, row.code_country]
+        return map_params
+
+    def add_map_params(self, map_params: dict):
+        rows = [(name, country_code, params[2], params[1], params[0])
+                for (name, country_code), params in map_params.items()]
+        with db.atomic():
+            for batch in chunked(rows, INSERT_BATCH_SIZE):
+                self.insert_many(batch, fields=self.fields_without_id).on_conflict_ignore().execute()
+
+
+class RegionsMapRollup(BaseModel):
+    grain = CharField(max_length=5)
+    period_start = DateField(formats='%Y-%m-%d')
+    city_id = ForeignKeyField(model=Cities, field=Cities.id, on_delete='CASCADE')
+    users_count = IntegerField()
+
+    class Meta:
+        indexes = ((('grain', 'period_start', 'city_id'), True),)
+
+
+class RegionsMap(BaseModel, ModelWithRollups):
     date_id = ForeignKeyField(model=Date, field=Date.id, on_delete='CASCADE')
     city_id = ForeignKeyField(model=Cities, field=Cities.id, on_delete='CASCADE')
     users_count = IntegerField()
 
-    def add_metric_row(self, date_id: int, metric_data: dict):
-        city = metric_data['dimensions'][0]['id']
-        name_city = metric_data['dimensions'][0]['name']
-        iso_name = metric_data['dimensions'][0]['iso_name']
-        country_code = iso_name[:2] if iso_name else ''
-        city_id = Cities().get_or_none(Cities.city == city)
-        if city_id is None:
-            map_params = MapDataRequester().get_data_from_map(
-                name_city=name_city, country_code=country_code
+    dimension_model = Cities
+    dimension_key = 'city'
+    rollup_model = RegionsMapRollup
+    member_columns = ['name', 'code_country', 'lat', 'long']
+
+    def prepare_metric_data(self, metric_data: list):
+        new_cities = {
+            item['dimensions'][0]['id']: (
+                item['dimensions'][0]['name'],
+                item['dimensions'][0]['iso_name'][:2] if item['dimensions'][0]['iso_name'] else ''
             )
-            city_id = Cities.insert(
-                city=city, name=metric_data['dimensions'][0]['name'],
-                code_country=map_params[2], lat=map_params[1], long=map_params[0]
-            ).execute()
-        self.insert(
-            date_id=date_id,
-            city_id=city_id,
-            users_count=metric_data['metrics'][0]
-        ).execute()
+            for item in metric_data if item['dimensions'][0]['id'] not in self.dimension_resolver
+        }
+        if not new_cities:
+            return
+        cities = set(new_cities.values())
+        map_params = GeocodingCache().get_map_params(cities=cities)
+        missed_cities = cities - map_params.keys()
+        if missed_cities:
+            geocoded, errors = MapDataRequester().get_data_from_map_for_cities(cities=missed_cities)
+            GeocodingCache().add_map_params(map_params=geocoded)
+            map_params.update(geocoded)
+            if errors:
+                # failed lookups are not cached, the report is retried with them on the next run
+                raise next(iter(errors.values()))
+        self.dimension_resolver.add_members(members={
+            city: (city, name, map_params[(name, country_code)][2],
+                   map_params[(name, country_code)][1], map_params[(name, country_code)][0])
+            for city, (name, country_code) in new_cities.items()
+        })
+
+    def make_metric_row(self, date_id: int, metric_data: dict) -> tuple:
+        city_id = self.dimension_resolver[metric_data['dimensions'][0]['id']]
+        return date_id, city_id, metric_data['metrics'][0]
 
     def get_list_with_city_name_code_country_coord(self, start_date: str, end_date: str) -> list:
-        start_date_id = Date().get(date=start_date)
-        end_date_id = Date().get(date=end_date)
-        query = self.select(Cities.name, Cities.code_country,
-                            Cities.lat, Cities.long,
-                            fn.SUM(self._meta.columns['users_count'])).\
-            join(Cities, on=self._meta.columns['city_id'] == Cities.id).\
-            where(
-                self._meta.columns['date_id'] >= start_date_id,
-                self._meta.columns['date_id'] <= end_date_id
-            ).group_by(
+        start_date, end_date = snap_range_to_retention(start_date=start_date, end_date=end_date)
+        rows = self.get_stored_rows(start_date=start_date, end_date=end_date)
+        if rows is not None:
+            return rows
+        pieces = self.select_range_pieces(start_date=start_date, end_date=end_date)
+        query = Cities.select(Cities.name, Cities.code_country,
+                              Cities.lat, Cities.long,
+                              fn.SUM(pieces.c.metric)).\
+            join(pieces, on=pieces.c.dimension_id == Cities.id).\
+            group_by(
                 Cities.name, Cities.code_country,
                 Cities.lat, Cities.long
             ).tuples()
@@ -145,23 +609,43 @@ class Devices(BaseModel):
     name = CharField(max_length=10, unique=True)
 
 
+class PageViewsByDevicesRollup(BaseModel):
+    grain = CharField(max_length=5)
+    period_start = DateField(formats='%Y-%m-%d')
+    device_id = ForeignKeyField(model=Devices, field=Devices.id, on_delete='CASCADE')
+    page_views = IntegerField()
+
+    class Meta:
+        indexes = ((('grain', 'period_start', 'device_id'), True),)
+
+
+class PageViewsByDevicesCumulative(BaseModel):
+    date_id = ForeignKeyField(model=Date, field=Date.id, on_delete='CASCADE')
+    device_id = ForeignKeyField(model=Devices, field=Devices.id, on_delete='CASCADE')
+    page_views = IntegerField()
+
+    class Meta:
+        indexes = ((('date_id', 'device_id'), True),)
+
+
 class PageViewsByDevices(BaseModel, ModelWithTwoId):
     date_id = ForeignKeyField(model=Date, field=Date.id, on_delete='CASCADE')
     device_id = ForeignKeyField(model=Devices, field=Devices.id, on_delete='CASCADE')
     page_views = IntegerField()
 
-    def add_metric_row(self, date_id: int, metric_data: dict):
+    dimension_model = Devices
+    dimension_key = 'device'
+    rollup_model = PageViewsByDevicesRollup
+    cumulative_model = PageViewsByDevicesCumulative
+
+    def get_dimension_member(self, dimension: dict) -> tuple:
+        return dimension['id'], (dimension['id'], dimension['name'])
+
+    def make_metric_row(self, date_id: int, metric_data: dict) -> tuple:
         device_name = metric_data['dimensions'][0]['id']
         page_views = metric_data['metrics'][0]
-        device_id = Devices().get_or_none(device=device_name)
-        if device_id is None:
-            name = metric_data['dimensions'][0]['name']
-            device_id = Devices().insert(device=device_name, name=name).execute()
-        self.insert(
-            date_id=date_id,
-            device_id=device_id,
-            page_views=page_views
-        ).execute()
+        device_id = self.dimension_resolver[device_name]
+        return date_id, device_id, page_views
 
 
 class TrafficSource(BaseModel):
@@ -169,6 +653,33 @@ class TrafficSource(BaseModel):
     name = CharField(max_length=50, unique=True)
 
 
+class VisitsCountByTrafficSourceRollup(BaseModel):
+    grain = CharField(max_length=5)
+    period_start = DateField(formats='%Y-%m-%d')
+    traffic_source_id = ForeignKeyField(
+        model=TrafficSource,
+        field=TrafficSource.id,
+        on_delete='CASCADE'
+    )
+    visits_count = IntegerField()
+
+    class Meta:
+        indexes = ((('grain', 'period_start', 'traffic_source_id'), True),)
+
+
+class VisitsCountByTrafficSourceCumulative(BaseModel):
+    date_id = ForeignKeyField(model=Date, field=Date.id, on_delete='CASCADE')
+    traffic_source_id = ForeignKeyField(
+        model=TrafficSource,
+        field=TrafficSource.id,
+        on_delete='CASCADE'
+    )
+    visits_count = IntegerField()
+
+    class Meta:
+        indexes = ((('date_id', 'traffic_source_id'), True),)
+
+
 class VisitsCountByTrafficSource(BaseModel, ModelWithTwoId):
     date_id = ForeignKeyField(model=Date, field=Date.id, on_delete='CASCADE')
     traffic_source_id = ForeignKeyField(
@@ -178,21 +689,19 @@ class VisitsCountByTrafficSource(BaseModel, ModelWithTwoId):
     )
     visits_count = IntegerField()
 
-    def add_metric_row(self, date_id: int, metric_data: dict):
+    dimension_model = TrafficSource
+    dimension_key = 'traffic_source_name'
+    rollup_model = VisitsCountByTrafficSourceRollup
+    cumulative_model = VisitsCountByTrafficSourceCumulative
+
+    def get_dimension_member(self, dimension: dict) -> tuple:
+        return dimension['id'], (dimension['id'], dimension['name'])
+
+    def make_metric_row(self, date_id: int, metric_data: dict) -> tuple:
         traffic_source_name = metric_data['dimensions'][0]['id']
         visits_count = metric_data['metrics'][0]
-        ts_id = TrafficSource().get_or_none(traffic_source_name=traffic_source_name)
-        if ts_id is None:
-            name = metric_data['dimensions'][0]['name']
-            ts_id = TrafficSource().insert(
-                traffic_source_name=traffic_source_name,
-                name=name
-            ).execute()
-        self.insert(
-            date_id=date_id,
-            traffic_source_id=ts_id,
-            visits_count=visits_count
-        ).execute()
+        ts_id = self.dimension_resolver[traffic_source_name]
+        return date_id, ts_id, visits_count
 
 
 class Users(BaseModel, BaseUser, UserMixin):
@@ -240,16 +749,63 @@ class Users(BaseModel, BaseUser, UserMixin):
         return True if [row for row in query] else False
 
 
-db.connect()
-db.create_tables([Date, VisitsCountByHour, Cities, RegionsMap,
-                  Devices, TrafficSource, PageViewsByDevices,
-                  VisitsCountByTrafficSource])
+def get_dashboard_aggregates(start_date: str, end_date: str, names: list = None) -> dict:
+    queries = {
+        'visits_count_by_hour': lambda: VisitsCountByHour().get_data_from_joining_models(
+            start_date=start_date,
+            end_date=end_date,
+            select_name_column='visits_count_by_hour',
+            order_name_column='hour_id',
+            model=HoursInDay
+        ),
+        'page_views_by_devices': lambda: PageViewsByDevices().get_data_from_joining_models(
+            start_date=start_date,
+            end_date=end_date,
+            select_name_column='page_views',
+            order_name_column='device_id',
+            model=Devices
+        ),
+        'visits_count_by_traffic_source': lambda: VisitsCountByTrafficSource().get_data_from_joining_models(
+            start_date=start_date,
+            end_date=end_date,
+            select_name_column='visits_count',
+            order_name_column='traffic_source_id',
+            model=TrafficSource
+        ),
+        'regions_map': lambda: RegionsMap().get_list_with_city_name_code_country_coord(
+            start_date=start_date,
+            end_date=end_date
+        ),
+    }
+    with read_only(), db.atomic():
+        return {name: query() for name, query in queries.items() if names is None or name in names}
 
 
 cases_of_create_default_models = [HoursInDay, Users]
-for default_model in cases_of_create_default_models:
-    if default_model._meta.table_name not in db.get_tables():
-        db.create_tables([default_model])
-        default_model().insert_default_values()
+cases_of_fact_models = [VisitsCountByHour, RegionsMap,
+                        PageViewsByDevices, VisitsCountByTrafficSource]
+
+
+def init_db():
+    from backend.migrations import migrate
+
+    with db.connection_context():
+        db.create_tables([Date, IngestionLedger, VisitsCountByHour, Cities, GeocodingCache,
+                          RegionsMap, Devices, TrafficSource, PageViewsByDevices,
+                          VisitsCountByTrafficSource])
+
+        for default_model in cases_of_create_default_models:
+            if default_model._meta.table_name not in db.get_tables():
+                db.create_tables([default_model])
+                default_model().insert_default_values()
+
+        for fact_model in cases_of_fact_models:
+            if fact_model.rollup_model._meta.table_name not in db.get_tables():
+                db.create_tables([fact_model.rollup_model])
+                fact_model().update_rollups(dates=[row.date for row in Date.select()])
+            cumulative_model = fact_model.cumulative_model
+            if cumulative_model and cumulative_model._meta.table_name not in db.get_tables():
+                db.create_tables([cumulative_model])
+                fact_model().update_cumulative(dates=[row.date for row in Date.select()])
 
-db.close()
+        migrate()
@@ -0,0 +1,134 @@
+import json
+import os
+from datetime import date
+
+try:
+    import duckdb
+    import numpy as np
+except ImportError:
+    duckdb = None
+from peewee import FloatField, IntegerField
+
+from backend.models import db, Date, IngestionLedger, get_month_end
+from backend.settings import FACT_STORAGE, PARQUET_DIR
+
+
+def get_column_type(field) -> str:
+    if isinstance(field, FloatField):
+        return 'float64'
+    if isinstance(field, IntegerField):
+        return 'int64'
+    return 'object'
+
+
+def quote_path(path: str) -> str:
+    return "'{0}'".format(path.replace("'", "''"))
+
+
+class ParquetStorage:
+    engine = FACT_STORAGE
+    connection = None
+    storages = {}
+
+    def __init__(self, fact_model):
+        self.fact_model = fact_model
+        self.directory = os.path.join(PARQUET_DIR, fact_model._meta.table_name)
+        self.members_path = os.path.join(self.directory, 'members.parquet')
+        self.meta_path = os.path.join(self.directory, 'meta.json')
+
+    @classmethod
+    def of(cls, fact_model) -> 'ParquetStorage':
+        if fact_model not in cls.storages:
+            cls.storages[fact_model] = cls(fact_model=fact_model)
+        return cls.storages[fact_model]
+
+    @property
+    def enabled(self) -> bool:
+        return self.engine == 'parquet' and duckdb is not None
+
+    @classmethod
+    def cursor(cls):
+        if cls.connection is None:
+            cls.connection = duckdb.connect()
+        return cls.connection.cursor()
+
+    def get_rows(self, start_date: str, end_date: str):
+        if not self.enabled or not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path) as file:
+            meta = json.load(file)
+        if meta['version'] != IngestionLedger().get_version(report=self.fact_model.__name__):
+            return None
+        start_date = date.fromisoformat(f'{start_date}')
+        end_date = date.fromisoformat(f'{end_date}')
+        paths = [self.__get_partition_path(month_start=date.fromisoformat(f'{month}-01'))
+                 for month in meta['months']
+                 if start_date <= get_month_end(date.fromisoformat(f'{month}-01'))
+                 and date.fromisoformat(f'{month}-01') <= end_date]
+        if not paths:
+            return []
+        member_columns = ', '.join(f'm.{column}' for column in self.fact_model.member_columns)
+        query = f'SELECT {member_columns}, SUM(f.metric) FROM read_parquet(?) AS f ' \
+                f'JOIN read_parquet({quote_path(self.members_path)}) AS m ON m.id = f.dimension_id ' \
+                f'WHERE f.date_id BETWEEN ? AND ? ' \
+                f'GROUP BY {member_columns} ORDER BY {member_columns}'
+        return self.cursor().execute(query, [paths, Date.get_key(start_date),
+                                             Date.get_key(end_date)]).fetchall()
+
+    def update(self, dates: list):
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self.meta_path):
+            dates = [row.date for row in Date.select(Date.date)]
+        months = {date.fromisoformat(f'{date_work}').replace(day=1) for date_work in dates}
+        for month_start in sorted(months):
+            self.__write_partition(month_start=month_start)
+        self.__write_members()
+        stored_months = sorted(
+            file_name[:-len('.parquet')] for file_name in os.listdir(self.directory)
+            if file_name.endswith('.parquet') and file_name != 'members.parquet'
+        )
+        with open(f'{self.meta_path}.tmp', 'w') as file:
+            json.dump({
+                'version': IngestionLedger().get_version(report=self.fact_model.__name__),
+                'months': stored_months,
+            }, file)
+        os.replace(f'{self.meta_path}.tmp', self.meta_path)
+
+    def __get_partition_path(self, month_start: date) -> str:
+        return os.path.join(self.directory, f'{month_start:%Y-%m}.parquet')
+
+    def __write_partition(self, month_start: date):
+        date_id, dimension, metric = self.fact_model().fields_without_id
+        query = self.fact_model.select(date_id, dimension, metric).where(
+            date_id.between(Date.get_key(month_start), Date.get_key(get_month_end(month_start)))
+        )
+        rows = list(db.execute(query))
+        path = self.__get_partition_path(month_start=month_start)
+        if not rows:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        self.__copy_columns(path=path, columns={
+            'date_id': np.array([row[0] for row in rows], dtype='int64'),
+            'dimension_id': np.array([row[1] for row in rows], dtype='int64'),
+            'metric': np.array([row[2] for row in rows], dtype='int64'),
+        })
+
+    def __write_members(self):
+        dimension_model = self.fact_model.dimension_model
+        fields = [dimension_model._meta.primary_key] + \
+                 [dimension_model._meta.columns[column] for column in self.fact_model.member_columns]
+        rows = list(db.execute(dimension_model.select(*fields)))
+        self.__copy_columns(path=self.members_path, columns={
+            field.column_name: np.array([row[i] for row in rows], dtype=get_column_type(field=field))
+            for i, field in enumerate(fields)
+        })
+
+    def __copy_columns(self, path: str, columns: dict):
+        cursor = self.cursor()
+        cursor.register('columns', columns)
+        cursor.execute(f'COPY columns TO {quote_path(f"{path}.tmp")} (FORMAT PARQUET)')
+        cursor.close()
+        os.replace(f'{path}.tmp', path)
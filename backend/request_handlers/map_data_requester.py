@@ -1,14 +1,41 @@
-from backend.settings import URL_MAP
-from backend.request_handlers.requester import Requester
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.settings import URL_MAP, GEOCODER_REQUESTS_PER_SECOND, GEOCODER_WORKERS
+from backend.request_handlers.rate_limiter import TokenBucket
+from backend.request_handlers.requester import Requester, RequestFailed
 
 
 class MapDataRequester(Requester):
+    rate_limiter = TokenBucket(rate=GEOCODER_REQUESTS_PER_SECOND)
+
+    def get_data_from_map_for_cities(self, cities: set) -> (dict, dict):
+        cities = list(cities)
+        with ThreadPoolExecutor(max_workers=GEOCODER_WORKERS) as executor:
+            results = executor.map(self.__try_get_data_from_map, cities)
+            map_params, errors = {}, {}
+            for city, result in zip(cities, results):
+                if isinstance(result, RequestFailed):
+                    errors[city] = result
+                else:
+                    map_params[city] = result
+            return map_params, errors
+
+    def __try_get_data_from_map(self, city: tuple):
+        try:
+            return self.get_data_from_map(name_city=city[0], country_code=city[1])
+        except RequestFailed as exc:
+            return exc
+
     def get_data_from_map(self, name_city: str, country_code: str) -> list:
         if not country_code:
             name_city = name_city.replace('-', ' ')
-        rsp = self.get(url=URL_MAP.format(name_city))
-        res = self.__get_list_lat_long_cc(response=rsp,
-                                          country_code=country_code) if rsp else []
+        url = URL_MAP.format(name_city)
+        rsp = self.get(url=url)
+        try:
+            members = rsp['response']['GeoObjectCollection']['featureMember']
+        except (KeyError, TypeError):
+            raise RequestFailed(url=url, reason='no featureMember in the response')
+        res = self.__get_list_lat_long_cc(members=members, country_code=country_code)
         if res:
             return res
         elif name_city.find('-') != -1:
@@ -20,9 +47,8 @@ class MapDataRequester(Requester):
             return [0, 0, '']
 
     @staticmethod
-    def __get_list_lat_long_cc(response: dict, country_code: str) -> list:
-        response = response['response']['GeoObjectCollection']['featureMember']
-        for row in response:
+    def __get_list_lat_long_cc(members: list, country_code: str) -> list:
+        for row in members:
             row = row['GeoObject']
             if country_code:
                 rsp_code_country = row['metaDataProperty']['GeocoderMetaData']['Address'].get('country_code')
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Full
+from threading import Event
+
+from backend.request_handlers.requester import Requester
+from backend.settings import URL, HEADER, FETCH_WORKERS, METRICA_PAGE_SIZE
+
+
+class ReportsFetcher:
+    def __init__(self, queries: dict):
+        self.queries = queries
+        self.pages = Queue(maxsize=FETCH_WORKERS)
+        self.stopped = Event()
+
+    def __iter__(self):
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            for name_model, params in self.queries.items():
+                executor.submit(self.__put_pages, name_model=name_model, params=params)
+            try:
+                count_running = len(self.queries)
+                while count_running:
+                    name_model, page = self.pages.get()
+                    if page is None or isinstance(page, Exception):
+                        count_running -= 1
+                    yield name_model, page
+            finally:
+                self.stopped.set()
+
+    def __put_pages(self, name_model: str, params: dict):
+        try:
+            for page in Requester().get_pages(url=URL, params=params,
+                                              page_size=METRICA_PAGE_SIZE, headers=HEADER):
+                if not self.__put(item=(name_model, page)):
+                    return
+            self.__put(item=(name_model, None))
+        except Exception as exc:
+            self.__put(item=(name_model, exc))
+
+    def __put(self, item: tuple) -> bool:
+        while not self.stopped.is_set():
+            try:
+                self.pages.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
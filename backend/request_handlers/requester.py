@@ -1,22 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+from random import uniform
+from time import sleep
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from backend.request_handlers.rate_limiter import TokenBucket
+from backend.settings import REQUESTS_POOL_SIZE, REQUESTS_TIMEOUT, REQUESTS_RETRIES, \
+    REQUESTS_BACKOFF_SECONDS, METRICA_REQUESTS_PER_SECOND
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RequestFailed(Exception):
+    def __init__(self, url: str, reason, retries: int = 0):
+        self.url = url
+        self.reason = reason
+        self.retries = retries
+
+    def __str__(self):
+        if self.retries:
+            return f'Request to {self.url} failed after {self.retries} retries: {self.reason}'
+        return f'Request to {self.url} failed: {self.reason}'
 
 
 def checking_response(func):
-    def wrapper(*args, **kwargs) -> dict:
-        res = func(*args, **kwargs)
-        if res.status_code == 200:
-            res = res.json()
-            if 'errors' in res:
-                print(res['errors']['message'])
-            else:
-                return res
-        else:
-            print('Status_code:', res.status_code)
-        return {}
+    def wrapper(self, url: str, **kwargs) -> dict:
+        res = func(self, url=url, **kwargs)
+        if res.status_code != 200:
+            raise RequestFailed(url=url, reason=f'status code {res.status_code}')
+        res = res.json()
+        if 'errors' in res:
+            errors = res['errors']
+            raise RequestFailed(url=url, reason=errors['message'] if isinstance(errors, dict)
+                                else res.get('message', errors))
+        return res
     return wrapper
 
 
+def make_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=REQUESTS_POOL_SIZE, pool_maxsize=REQUESTS_POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
 class Requester:
+    session = make_session()
+    rate_limiter = TokenBucket(rate=METRICA_REQUESTS_PER_SECOND)
+
     @checking_response
     def get(self, url: str, **kwargs):
-        return requests.get(url=url, **kwargs)
+        reason = None
+        for attempt in range(REQUESTS_RETRIES + 1):
+            if attempt:
+                sleep(self.__get_backoff_seconds(attempt=attempt, reason=reason))
+            self.rate_limiter.acquire()
+            try:
+                res = self.session.get(url=url, timeout=REQUESTS_TIMEOUT, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                reason = exc
+                continue
+            if res.status_code not in RETRY_STATUS_CODES:
+                return res
+            reason = res
+        raise RequestFailed(url=url, reason=reason, retries=REQUESTS_RETRIES)
+
+    @staticmethod
+    def __get_backoff_seconds(attempt: int, reason) -> float:
+        backoff_seconds = REQUESTS_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        retry_after = getattr(reason, 'headers', {}).get('Retry-After', '')
+        if retry_after.isdigit():
+            backoff_seconds = max(backoff_seconds, int(retry_after))
+        return uniform(backoff_seconds / 2, backoff_seconds)
+
+    def get_pages(self, url: str, params: dict, page_size: int, **kwargs):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            offset = 1
+            next_page = executor.submit(self.__get_page, url=url, params=params,
+                                        limit=page_size, offset=offset, **kwargs)
+            while next_page is not None:
+                response = next_page.result()
+                offset += page_size
+                next_page = None
+                if response['data'] and offset <= response['total_rows']:
+                    next_page = executor.submit(self.__get_page, url=url, params=params,
+                                                limit=page_size, offset=offset, **kwargs)
+                yield response['data']
+
+    def __get_page(self, url: str, params: dict, limit: int, offset: int, **kwargs) -> dict:
+        return self.get(url=url, params={**params, 'limit': limit, 'offset': offset}, **kwargs)
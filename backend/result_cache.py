@@ -0,0 +1,76 @@
+import os
+import pickle
+from hashlib import sha1
+from time import time_ns
+
+from backend.settings import RESULT_CACHE_DIR, RESULT_CACHE_SIZE
+
+DATA_VERSION_FILE = 'data_version'
+
+
+def bump_data_version():
+    if not RESULT_CACHE_DIR:
+        return
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(RESULT_CACHE_DIR, DATA_VERSION_FILE)
+    with open(f'{path}.{os.getpid()}.tmp', 'w') as file:
+        file.write(f'{time_ns()}')
+    os.replace(f'{path}.{os.getpid()}.tmp', path)
+
+
+def get_data_version() -> str:
+    try:
+        with open(os.path.join(RESULT_CACHE_DIR, DATA_VERSION_FILE)) as file:
+            return file.read()
+    except FileNotFoundError:
+        return ''
+
+
+class ResultCache:
+    @property
+    def enabled(self) -> bool:
+        return bool(RESULT_CACHE_DIR) and RESULT_CACHE_SIZE > 0
+
+    def get(self, key: tuple):
+        if not self.enabled:
+            return None
+        path = self.__get_path(key=key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def set(self, key: tuple, value):
+        if not self.enabled:
+            return
+        os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+        path = self.__get_path(key=key)
+        with open(f'{path}.{os.getpid()}.tmp', 'wb') as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+        self.__evict()
+
+    def __get_path(self, key: tuple) -> str:
+        digest = sha1(repr(key).encode()).hexdigest()
+        return os.path.join(RESULT_CACHE_DIR, f'{digest}.pickle')
+
+    def __evict(self):
+        entries = []
+        for entry in os.scandir(RESULT_CACHE_DIR):
+            if entry.name.endswith('.pickle'):
+                try:
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:
+                    continue
+        entries.sort()
+        for _, path in entries[:max(len(entries) - RESULT_CACHE_SIZE, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
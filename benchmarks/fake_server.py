@@ -0,0 +1,129 @@
+import json
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from random import Random
+from threading import Thread, Lock
+from time import sleep
+from urllib.parse import urlsplit, parse_qs
+
+METRICA_PATH = '/stat/v1/data'
+GEOCODER_PATH = '/1.x/'
+DATE_DIMENSION = 'ym:s:date'
+DEVICES = ['desktop', 'mobile', 'tablet', 'tv']
+TRAFFIC_SOURCES = ['organic', 'direct', 'ad', 'referral', 'social', 'email', 'internal', 'saved']
+
+
+def make_synthetic_rows(dimensions: str, cities: int) -> list:
+    if dimensions.endswith('startOfHour'):
+        return [{'dimensions': [{'name': f'2000-01-01 {hour:0>2}:00:00'}], 'metrics': [0]}
+                for hour in range(24)]
+    if dimensions.endswith('deviceCategory'):
+        return [{'dimensions': [{'id': device, 'name': device.title()}], 'metrics': [0]}
+                for device in DEVICES]
+    if dimensions.endswith('TrafficSource'):
+        return [{'dimensions': [{'id': source, 'name': source.title()}], 'metrics': [0]}
+                for source in TRAFFIC_SOURCES]
+    if dimensions.endswith('regionCity'):
+        return [{'dimensions': [{'id': city, 'name': f'City-{city}', 'iso_name': 'RU-MOW'}],
+                 'metrics': [0]} for city in range(1, cities + 1)]
+    return []
+
+
+class FakeMetricaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, reports: dict, latency: float = 0.0, miss_ratio: float = 0.1):
+        super().__init__(('127.0.0.1', 0), FakeMetricaHandler)
+        self.reports = reports
+        self.latency = latency
+        self.miss_ratio = miss_ratio
+        # (dimensions, day) of reports answered with 503
+        self.failing_reports = set()
+        # message of the 'errors' body Metrica answers with 200 on wrong parameters
+        self.report_errors = ''
+        # status of geocoder responses, 403 is what an exhausted daily quota looks like
+        self.geocoder_status = 200
+        self.count_requests = 0
+        self.lock = Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def start(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+
+    def get_report(self, params: dict) -> dict:
+        dimensions = params['dimensions']
+        with_date = dimensions.startswith(f'{DATE_DIMENSION},')
+        if with_date:
+            dimensions = dimensions[len(DATE_DIMENSION) + 1:]
+        day, last_day = date.fromisoformat(params['date1']), date.fromisoformat(params['date2'])
+        if any(failing_dimensions == dimensions and day <= failing_day <= last_day
+               for failing_dimensions, failing_day in self.failing_reports):
+            return None
+        rows = []
+        while day <= last_day:
+            rows.extend(self.__get_rows_of_day(dimensions=dimensions, day=day, with_date=with_date))
+            day += timedelta(days=1)
+        offset = int(params.get('offset', 1)) - 1
+        limit = int(params.get('limit', 100))
+        return {'data': rows[offset:offset + limit], 'total_rows': len(rows)}
+
+    def __get_rows_of_day(self, dimensions: str, day: date, with_date: bool) -> list:
+        random = Random(f'{dimensions}{day}')
+        rows = []
+        for row in self.reports.get(dimensions, []):
+            row_dimensions = [dict(dimension) for dimension in row['dimensions']]
+            if dimensions.endswith('startOfHour'):
+                row_dimensions[0]['name'] = f"{day} {row_dimensions[0]['name'].split(' ')[1]}"
+            if with_date:
+                row_dimensions.insert(0, {'name': f'{day}'})
+            rows.append({'dimensions': row_dimensions, 'metrics': [random.randint(1, 1000)]})
+        return rows
+
+    def get_geocode(self, name: str) -> dict:
+        if Random(name).random() < self.miss_ratio:
+            members = []
+        else:
+            random = Random(name)
+            members = [{'GeoObject': {
+                'metaDataProperty': {'GeocoderMetaData': {'Address': {'country_code': 'RU'}}},
+                'Point': {'pos': f'{random.uniform(-180, 180):.6f} {random.uniform(-80, 80):.6f}'},
+            }}]
+        return {'response': {'GeoObjectCollection': {'featureMember': members}}}
+
+
+class FakeMetricaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.count_requests += 1
+        sleep(self.server.latency)
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == METRICA_PATH and self.server.report_errors:
+            self.__send_json({'errors': [{'message': self.server.report_errors}],
+                              'message': self.server.report_errors})
+        elif url.path == METRICA_PATH:
+            report = self.server.get_report(params=params)
+            if report is None:
+                self.send_error(503)
+            else:
+                self.__send_json(report)
+        elif url.path == GEOCODER_PATH and self.server.geocoder_status != 200:
+            self.send_error(self.server.geocoder_status)
+        elif url.path == GEOCODER_PATH:
+            self.__send_json(self.server.get_geocode(name=params.get('geocode', '')))
+        else:
+            self.send_error(404)
+
+    def __send_json(self, data: dict):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
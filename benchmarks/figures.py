@@ -0,0 +1,166 @@
+import json
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+
+from pages import figures
+from pages.figures import get_limits_params_for_map, get_title_text
+
+
+def parse_args():
+    parser = ArgumentParser(description='Compare go.Figure and pre-serialized dict figures '
+                                        'of the home page')
+    parser.add_argument('--cities', type=int, default=5000, help='cities on the regions map')
+    parser.add_argument('--repeat', type=int, default=20, help='runs of every chart, best is shown')
+    return parser.parse_args()
+
+
+def go_bar_figure(visits_count_by_traffic_source: list) -> go.Figure:
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=[row[0] for row in visits_count_by_traffic_source],
+        y=[row[1] for row in visits_count_by_traffic_source],
+        hovertemplate='%{x}: %{y:.f}<extra></extra>',
+    ))
+    fig.update_layout(
+        title_font_size=25, title_x=0.5,
+        title_text='visits_count_by_traffic_source'
+    )
+    return fig
+
+
+def go_pie_figure(page_views_by_devices: list) -> go.Figure:
+    fig = go.Figure()
+    fig.add_trace(go.Pie(
+        labels=[row[0] for row in page_views_by_devices],
+        values=[row[1] for row in page_views_by_devices]
+    ))
+    fig.update_traces(
+        hoverinfo='label+percent', textinfo='value',
+        textfont_size=20, marker=dict(line=dict(color='#000000', width=2)))
+    fig.update_layout(
+        title_font_size=25, title_x=0.5,
+        title_text='page_views_by_devices'
+    )
+    return fig
+
+
+def go_scatter_figure(visits_count_by_every_hour: list, start_date: str, end_date: str) -> go.Figure:
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=[row[0] for row in visits_count_by_every_hour],
+        y=[row[1] for row in visits_count_by_every_hour],
+        mode='markers',
+    ))
+    fig.update_layout(
+        xaxis_title=get_title_text(start_date=start_date, end_date=end_date),
+        yaxis_title='Visits',
+        title_font_size=25, title_x=0.5,
+        title_text='visits_count_by_hour'
+    )
+    return fig
+
+
+def go_scattergeo_figure(mapping_data: list) -> go.Figure:
+    text = 'City: {0}<br>Country index: {1}' \
+           '<br>Count visitors: {2}'
+    df = pd.DataFrame({
+        'text': [text.format(row[0], row[1], row[4]) if row[1]
+                 else text.format(row[0], 'not defined', row[4])
+                 for row in mapping_data],
+        'lat': [row[2] for row in mapping_data],
+        'long': [row[3] for row in mapping_data],
+        'users_count': [row[4] for row in mapping_data],
+    })
+    fig = go.Figure()
+    limits = get_limits_params_for_map(
+        counts_users=list({row[-1] for row in mapping_data})
+    )
+    for i, lim in enumerate(limits):
+        if lim != limits[-1]:
+            name = f'{lim[0]} - {lim[1]}'
+            df_sub = df.query('@lim[0] <= users_count <= @lim[1]')
+        else:
+            name = f'{lim[0]} <'
+            df_sub = df[df['users_count'] >= lim[0]]
+        fig.add_trace(go.Scattermapbox(
+            lat=df_sub['lat'], lon=df_sub['long'],
+            text=df_sub['text'], name=name,
+            mode='markers',
+            marker=dict(
+                size=2 * 45 / lim[2] ** 2,
+                color=figures.COLORS_OF_CITIES_ON_MAP[i],
+                sizemode='area'
+            ),
+        ))
+    fig.update_layout(
+        title_font_size=25, title_x=0.5,
+        title_text='regions_map',
+        margin={'l': 0, 't': 40, 'b': 0, 'r': 0},
+        mapbox={
+            'center': {'lon': 40, 'lat': 40},
+            'style': 'stamen-terrain',
+            'zoom': 1.5
+        }
+    )
+    return fig
+
+
+def make_rows(cities: int) -> dict:
+    return {
+        'visits_count_by_traffic_source': [(f'Source {i}', random.randint(1, 10 ** 5))
+                                           for i in range(8)],
+        'page_views_by_devices': [(name, random.randint(1, 10 ** 5))
+                                  for name in ['Desktop', 'Smartphones', 'Tablets']],
+        'visits_count_by_hour': [(f'{hour:0>2}:00:00', random.randint(1, 10 ** 4))
+                                 for hour in range(24)],
+        'regions_map': [(f'City {i}', random.choice(['RU', 'US', '']), random.uniform(-60, 60),
+                         random.uniform(-180, 180), int(random.paretovariate(1)))
+                        for i in range(cities)],
+    }
+
+
+def get_best_seconds(function, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    args = parse_args()
+    rows = make_rows(cities=args.cities)
+    charts = {
+        'bar': (lambda: go_bar_figure(rows['visits_count_by_traffic_source']),
+                lambda: figures.bar_figure_visits_count_by_traffic_source(
+                    rows['visits_count_by_traffic_source'])),
+        'pie': (lambda: go_pie_figure(rows['page_views_by_devices']),
+                lambda: figures.pie_figure_page_views_by_devices(rows['page_views_by_devices'])),
+        'scatter': (lambda: go_scatter_figure(rows['visits_count_by_hour'],
+                                              '2020-01-01', '2020-12-31'),
+                    lambda: figures.scatter_figure_visits_count_by_hour(
+                        rows['visits_count_by_hour'], '2020-01-01', '2020-12-31')),
+        'regions map': (lambda: go_scattergeo_figure(rows['regions_map']),
+                        lambda: figures.scattergeo_figure_regions_map(rows['regions_map'])),
+    }
+    print(f'{"chart":<13}{"path":<10}{"build, ms":>11}{"serialize, ms":>15}{"payload, KB":>13}')
+    for name_chart, builds in charts.items():
+        for name_path, build in zip(['go.Figure', 'dict'], builds):
+            figure = build()
+            payload = json.dumps(figure, cls=PlotlyJSONEncoder)
+            build_seconds = get_best_seconds(build, repeat=args.repeat)
+            serialize_seconds = get_best_seconds(lambda: json.dumps(figure, cls=PlotlyJSONEncoder),
+                                                 repeat=args.repeat)
+            print(f'{name_chart:<13}{name_path:<10}{build_seconds * 1000:>11.2f}'
+                  f'{serialize_seconds * 1000:>15.2f}{len(payload) / 1024:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import json
+import os
+from argparse import ArgumentParser
+from resource import getrusage, RUSAGE_CHILDREN, RUSAGE_SELF
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import backend.settings as settings
+from benchmarks.fake_server import FakeMetricaServer, METRICA_PATH, GEOCODER_PATH, \
+    make_synthetic_rows
+
+
+def parse_args():
+    parser = ArgumentParser(description='Measure ingestion throughput against a local '
+                                        'Metrica/geocoder stand-in')
+    parser.add_argument('--days', type=int, default=7, help='count of days to load')
+    parser.add_argument('--cities', type=int, default=1000, help='cities in the geo report')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds of latency of every fake API response')
+    parser.add_argument('--recorded-dir',
+                        help='directory with recorded one-day responses named <model>.json')
+    parser.add_argument('--backfill', action='store_true', help='use Worker.backfill')
+    parser.add_argument('--processes', type=int, default=1, help='backfill processes')
+    return parser.parse_args()
+
+
+def load_reports(cities: int, recorded_dir: str = None) -> dict:
+    reports = {}
+    for name_model, query in settings.CASES_OF_MODEL_QUERY.items():
+        path = os.path.join(recorded_dir, f'{name_model}.json') if recorded_dir else ''
+        if os.path.exists(path):
+            with open(path) as file:
+                reports[query['dimensions']] = json.load(file)['data']
+        else:
+            reports[query['dimensions']] = make_synthetic_rows(
+                dimensions=query['dimensions'], cities=cities
+            )
+    return reports
+
+
+def configure_settings(server: FakeMetricaServer, db_name: str):
+    settings.DB_NAME = db_name
+    settings.URL = f'{server.url}{METRICA_PATH}'
+    settings.URL_MAP = f'{server.url}{GEOCODER_PATH}?format=json&geocode={{0}}'
+    settings.METRICA_REQUESTS_PER_SECOND = 1000
+    settings.GEOCODER_REQUESTS_PER_SECOND = 1000
+
+
+def count_statements(db) -> list:
+    counter = [0]
+    execute_sql = db.execute_sql
+
+    def counting_execute_sql(*args, **kwargs):
+        counter[0] += 1
+        return execute_sql(*args, **kwargs)
+
+    db.execute_sql = counting_execute_sql
+    return counter
+
+
+def main():
+    args = parse_args()
+    server = FakeMetricaServer(reports=load_reports(cities=args.cities,
+                                                    recorded_dir=args.recorded_dir),
+                               latency=args.latency)
+    server.start()
+    with TemporaryDirectory() as tmp_dir:
+        configure_settings(server=server, db_name=os.path.join(tmp_dir, 'benchmark.db'))
+        from backend.main import Worker
+        from backend.models import db, init_db, VisitsCountByHour, RegionsMap, PageViewsByDevices, \
+            VisitsCountByTrafficSource
+
+        init_db()
+        statements = count_statements(db=db)
+        start = perf_counter()
+        if args.backfill:
+            Worker().backfill(delta_days=args.days, processes=args.processes)
+        else:
+            Worker().run(delta_days=args.days)
+        seconds = perf_counter() - start
+
+        count_rows = sum(model.select().count() for model in [
+            VisitsCountByHour, RegionsMap, PageViewsByDevices, VisitsCountByTrafficSource
+        ])
+        print(f'rows:          {count_rows}')
+        print(f'seconds:       {seconds:.2f}')
+        print(f'rows/sec:      {count_rows / seconds:.0f}')
+        print(f'requests:      {server.count_requests}')
+        print(f'requests/sec:  {server.count_requests / seconds:.1f}')
+        print(f'statements:    {statements[0]}')
+        print(f'peak RSS, MB:  {getrusage(RUSAGE_SELF).ru_maxrss / 1024:.1f} (writer process)')
+        if args.backfill and args.processes > 1:
+            print(f'peak RSS, MB:  {getrusage(RUSAGE_CHILDREN).ru_maxrss / 1024:.1f} '
+                  f'(largest fetch process)')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
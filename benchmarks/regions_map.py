@@ -0,0 +1,125 @@
+import json
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+from pages.figures import COLORS_OF_CITIES_ON_MAP, RADIUS_OF_CITIES_ON_MAP, get_limits_params_for_map, \
+    get_map_view, scattergeo_figure_regions_map
+
+
+def parse_args():
+    parser = ArgumentParser(description='Compare the pandas and NumPy bucketing of the regions map '
+                                        'and the payload of the clustered map')
+    parser.add_argument('--cities', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='cities on the regions map, one run per value')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every size, best is shown')
+    return parser.parse_args()
+
+
+def pandas_limits_params_for_map(counts_users: list) -> list:
+    counts_users.sort(key=lambda x: x)
+    len_diapason = len(counts_users) // len(RADIUS_OF_CITIES_ON_MAP) + 1
+    limits = []
+    start = 0
+    for i in RADIUS_OF_CITIES_ON_MAP:
+        diapason = counts_users[start:] if start + len_diapason >= len(counts_users) \
+            else counts_users[start:start + len_diapason]
+        l_diapason = len(diapason)
+        if l_diapason == 1:
+            limits.append([diapason[0], diapason[0], i])
+            break
+        elif l_diapason == 0:
+            diapason = counts_users[start - len_diapason:-1]
+            limits[-1] = [diapason[0], diapason[-1], i]
+            limits.append([counts_users[-1], counts_users[-1], i])
+            break
+        else:
+            limits.append([diapason[0], diapason[-1], i])
+        start += len_diapason
+    return limits
+
+
+def pandas_figure_regions_map(mapping_data: list) -> dict:
+    text = 'City: {0}<br>Country index: {1}' \
+           '<br>Count visitors: {2}'
+    df = pd.DataFrame({
+        'text': [text.format(row[0], row[1], row[4]) if row[1]
+                 else text.format(row[0], 'not defined', row[4])
+                 for row in mapping_data],
+        'lat': [row[2] for row in mapping_data],
+        'long': [row[3] for row in mapping_data],
+        'users_count': [row[4] for row in mapping_data],
+    })
+    limits = pandas_limits_params_for_map(
+        counts_users=list({row[-1] for row in mapping_data})
+    )
+    data = []
+    for i, lim in enumerate(limits):
+        if lim != limits[-1]:
+            name = f'{lim[0]} - {lim[1]}'
+            df_sub = df.query('@lim[0] <= users_count <= @lim[1]')
+        else:
+            name = f'{lim[0]} <'
+            df_sub = df[df['users_count'] >= lim[0]]
+        data.append({
+            'type': 'scattermapbox',
+            'lat': df_sub['lat'], 'lon': df_sub['long'],
+            'text': df_sub['text'], 'name': name,
+            'mode': 'markers',
+            'marker': {
+                'size': 2 * 45 / lim[2] ** 2,
+                'color': COLORS_OF_CITIES_ON_MAP[i],
+                'sizemode': 'area',
+            },
+        })
+    return {'data': data}
+
+
+def make_rows(cities: int) -> list:
+    return [(f'City {i}', random.choice(['RU', 'US', '']), random.uniform(-60, 60),
+             random.uniform(-180, 180), int(random.paretovariate(0.7)))
+            for i in range(cities)]
+
+
+def get_best_seconds(function, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    args = parse_args()
+    view = get_map_view(relayout_data=None)
+    print(f'{"cities":>9}{"counts":>9}{"pandas, ms":>12}{"numpy, ms":>11}{"clustered, ms":>15}'
+          f'{"payload, KB":>13}{"clustered, KB":>15}')
+    for cities in args.cities:
+        rows = make_rows(cities=cities)
+        counts_users = list({row[-1] for row in rows})
+        if pandas_limits_params_for_map(list(counts_users)) != \
+                get_limits_params_for_map(counts_users=counts_users):
+            print(f'{cities} cities: the bucketings returned different limits')
+        for expected, actual in zip(pandas_figure_regions_map(rows)['data'],
+                                    scattergeo_figure_regions_map(rows)['data']):
+            if expected['lat'].tolist() != actual['lat'].tolist() or \
+                    expected['text'].tolist() != actual['text'].tolist():
+                print(f'{cities} cities: the bucketings put cities into different traces')
+        pandas_seconds = get_best_seconds(lambda: pandas_figure_regions_map(rows), repeat=args.repeat)
+        numpy_seconds = get_best_seconds(lambda: scattergeo_figure_regions_map(rows), repeat=args.repeat)
+        clustered_seconds = get_best_seconds(lambda: scattergeo_figure_regions_map(rows, view=view),
+                                             repeat=args.repeat)
+        payload = json.dumps(scattergeo_figure_regions_map(rows), cls=PlotlyJSONEncoder)
+        clustered_payload = json.dumps(scattergeo_figure_regions_map(rows, view=view), cls=PlotlyJSONEncoder)
+        print(f'{cities:>9}{len(counts_users):>9}{pandas_seconds * 1000:>12.1f}{numpy_seconds * 1000:>11.1f}'
+              f'{clustered_seconds * 1000:>15.1f}{len(payload) / 1024:>13.1f}'
+              f'{len(clustered_payload) / 1024:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import os
+import random
+from argparse import ArgumentParser
+from datetime import date, timedelta
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from peewee import chunked
+
+import backend.settings as settings
+
+
+def parse_args():
+    parser = ArgumentParser(description='Compare dashboard range queries on the SQLite and '
+                                        'Parquet fact storages')
+    parser.add_argument('--years', type=int, default=3, help='years of synthetic daily data')
+    parser.add_argument('--cities', type=int, default=1000, help='cities reported every day')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of every query, best is shown')
+    return parser.parse_args()
+
+
+def configure_settings(tmp_dir: str):
+    settings.DB_NAME = os.path.join(tmp_dir, 'benchmark.db')
+    settings.COLUMNAR_CACHE_DIR = ''
+    settings.FACT_STORAGE = 'parquet'
+    settings.PARQUET_DIR = os.path.join(tmp_dir, 'parquet')
+
+
+def fill_db(years: int, cities: int) -> list:
+    from backend.models import db, Cities, Date, HoursInDay, IngestionLedger, RegionsMap, \
+        VisitsCountByHour
+
+    end_date = date.today() - timedelta(days=1)
+    dates = [end_date - timedelta(days=i) for i in reversed(range(years * 365))]
+    date_ids = Date().get_ids(dates=dates)
+    with db.atomic():
+        for batch in chunked([(city, f'City {city}', 'RU', random.uniform(40, 60),
+                               random.uniform(30, 90)) for city in range(cities)],
+                             settings.INSERT_BATCH_SIZE):
+            Cities.insert_many(batch, fields=Cities().fields_without_id).execute()
+    city_ids = [city_id for city_id, in Cities.select(Cities.id).tuples()]
+    hour_ids = [hour_id for hour_id, in HoursInDay.select(HoursInDay.id).tuples()]
+    for model, dimension_ids in [(RegionsMap, city_ids), (VisitsCountByHour, hour_ids)]:
+        with db.atomic():
+            for date_id in date_ids.values():
+                rows = [(date_id, dimension_id, random.randint(1, 100))
+                        for dimension_id in dimension_ids]
+                for batch in chunked(rows, settings.INSERT_BATCH_SIZE):
+                    model.insert_many(batch, fields=model().fields_without_id).execute()
+            model().update_rollups(dates=dates)
+            model().update_cumulative(dates=dates)
+            IngestionLedger().finish_reports(report=model.__name__, rows_count_by_date_id={
+                date_id: len(dimension_ids) for date_id in date_ids.values()
+            })
+    return dates
+
+
+def get_best_seconds(function, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    args = parse_args()
+    with TemporaryDirectory() as tmp_dir:
+        configure_settings(tmp_dir=tmp_dir)
+        from backend.models import init_db, HoursInDay, RegionsMap, VisitsCountByHour
+        from backend.parquet_storage import ParquetStorage, duckdb
+
+        if duckdb is None:
+            exit('install duckdb to benchmark the Parquet storage')
+        init_db()
+        start = perf_counter()
+        dates = fill_db(years=args.years, cities=args.cities)
+        print(f'SQLite fill, s:     {perf_counter() - start:.2f}')
+        for model in [RegionsMap, VisitsCountByHour]:
+            start = perf_counter()
+            ParquetStorage.of(fact_model=model).update(dates=dates)
+            print(f'Parquet export, s:  {perf_counter() - start:.2f} ({model.__name__})')
+
+        queries = {
+            'regions map': lambda start_date, end_date: RegionsMap().
+            get_list_with_city_name_code_country_coord(start_date=start_date, end_date=end_date),
+            'visits by hour': lambda start_date, end_date: VisitsCountByHour().
+            get_data_from_joining_models(start_date=start_date, end_date=end_date,
+                                         select_name_column='visits_count_by_hour',
+                                         order_name_column='hour_id', model=HoursInDay),
+        }
+        ranges = {
+            'all years': (dates[0], dates[-1]),
+            'last year': (dates[-365], dates[-1]),
+            'last 90 days': (dates[-90], dates[-1]),
+            'mid-month 45 days': (dates[len(dates) // 2] + timedelta(days=14),
+                                  dates[len(dates) // 2] + timedelta(days=58)),
+        }
+        print(f'{"query":<16}{"range":<20}{"sqlite, ms":>12}{"parquet, ms":>13}')
+        for name_query, query in queries.items():
+            for name_range, (start_date, end_date) in ranges.items():
+                seconds = {}
+                rows = {}
+                for engine in ['sqlite', 'parquet']:
+                    ParquetStorage.engine = engine
+                    rows[engine] = query(start_date=f'{start_date}', end_date=f'{end_date}')
+                    seconds[engine] = get_best_seconds(
+                        lambda: query(start_date=f'{start_date}', end_date=f'{end_date}'),
+                        repeat=args.repeat
+                    )
+                if sorted(rows['sqlite']) != sorted(rows['parquet']):
+                    print(f'{name_query} {name_range}: the storages returned different rows')
+                print(f'{name_query:<16}{name_range:<20}'
+                      f'{seconds["sqlite"] * 1000:>12.1f}{seconds["parquet"] * 1000:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+from operator import itemgetter
+
+import numpy as np
+import plotly.io as pio
+
+RADIUS_OF_CITIES_ON_MAP = [3, 2.75, 2.25, 2, 1.5]
+COLORS_OF_CITIES_ON_MAP = ['royalblue', 'crimson', 'lightseagreen', 'orange', 'black']
+
+MAP_DEFAULT_CENTER = {'lon': 40, 'lat': 40}
+MAP_DEFAULT_ZOOM = 1.5
+MAP_MAX_ZOOM_LEVEL = 14
+MAP_MAX_LAT = 85.05112878
+# a zoom level doubles the world width, 512 pixels at zoom 0
+MAP_TILE_PIXELS = 512
+MAP_CELL_PIXELS = 40
+# assumed viewport when the browser did not report the map corners
+MAP_VIEWPORT_PIXELS = (1920, 1080)
+
+FIGURE_TEMPLATE = pio.templates[pio.templates.default].to_plotly_json()
+
+
+def get_layout(title_text: str, **layout) -> dict:
+    return {
+        'template': FIGURE_TEMPLATE,
+        'title': {'font': {'size': 25}, 'x': 0.5, 'text': title_text},
+        **layout,
+    }
+
+
+def bar_figure_visits_count_by_traffic_source(visits_count_by_traffic_source: list) -> dict:
+    return {
+        'data': [{
+            'type': 'bar',
+            'x': [row[0] for row in visits_count_by_traffic_source],
+            'y': [row[1] for row in visits_count_by_traffic_source],
+            'hovertemplate': '%{x}: %{y:.f}<extra></extra>',
+        }],
+        'layout': get_layout(title_text='visits_count_by_traffic_source'),
+    }
+
+
+def pie_figure_page_views_by_devices(page_views_by_devices: list) -> dict:
+    return {
+        'data': [{
+            'type': 'pie',
+            'labels': [row[0] for row in page_views_by_devices],
+            'values': [row[1] for row in page_views_by_devices],
+            'hoverinfo': 'label+percent',
+            'textinfo': 'value',
+            'textfont': {'size': 20},
+            'marker': {'line': {'color': '#000000', 'width': 2}},
+        }],
+        'layout': get_layout(title_text='page_views_by_devices'),
+    }
+
+
+def scatter_figure_visits_count_by_hour(visits_count_by_every_hour: list,
+                                        start_date: str, end_date: str) -> dict:
+    return {
+        'data': [{
+            'type': 'scatter',
+            'x': [row[0] for row in visits_count_by_every_hour],
+            'y': [row[1] for row in visits_count_by_every_hour],
+            'mode': 'markers',
+        }],
+        'layout': get_layout(
+            title_text='visits_count_by_hour',
+            xaxis={'title': {'text': get_title_text(start_date=start_date, end_date=end_date)}},
+            yaxis={'title': {'text': 'Visits'}},
+        ),
+    }
+
+
+def get_title_text(start_date: str, end_date: str) -> str:
+    if start_date == end_date:
+        return f'Hours of {start_date}'
+    else:
+        return f'Hours of {start_date} - {end_date}'
+
+
+def get_map_text(mapping_data: list) -> np.ndarray:
+    return np.array([f'City: {row[0]}<br>Country index: {row[1] or "not defined"}'
+                     f'<br>Count visitors: {row[4]}' for row in mapping_data], dtype=object)
+
+
+def get_map_columns(mapping_data: list) -> dict:
+    count = len(mapping_data)
+    return {
+        'lat': np.fromiter(map(itemgetter(2), mapping_data), dtype='float64', count=count),
+        'long': np.fromiter(map(itemgetter(3), mapping_data), dtype='float64', count=count),
+        'users_count': np.fromiter(map(itemgetter(4), mapping_data), dtype='int64', count=count),
+    }
+
+
+def get_mercator_y(lat):
+    lat = np.clip(lat, -MAP_MAX_LAT, MAP_MAX_LAT)
+    return np.degrees(np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)))
+
+
+def get_cell_size(zoom_level: int) -> float:
+    return 360 * MAP_CELL_PIXELS / (MAP_TILE_PIXELS * 2 ** zoom_level)
+
+
+def get_map_view(relayout_data: dict) -> tuple:
+    relayout_data = relayout_data or {}
+    zoom = relayout_data.get('mapbox.zoom', MAP_DEFAULT_ZOOM)
+    zoom_level = min(max(int(zoom), 0), MAP_MAX_ZOOM_LEVEL)
+    cell_size = get_cell_size(zoom_level=zoom_level)
+
+    coordinates = (relayout_data.get('mapbox._derived') or {}).get('coordinates')
+    if coordinates:
+        lons = [coordinate[0] for coordinate in coordinates]
+        ys = get_mercator_y(np.array([coordinate[1] for coordinate in coordinates]))
+        west, east, south, north = min(lons), max(lons), ys.min(), ys.max()
+    else:
+        center = relayout_data.get('mapbox.center', MAP_DEFAULT_CENTER)
+        degrees_per_pixel = 360 / (MAP_TILE_PIXELS * 2 ** zoom)
+        half_width = MAP_VIEWPORT_PIXELS[0] / 2 * degrees_per_pixel
+        half_height = MAP_VIEWPORT_PIXELS[1] / 2 * degrees_per_pixel
+        center_y = get_mercator_y(center['lat'])
+        west, east = center['lon'] - half_width, center['lon'] + half_width
+        south, north = center_y - half_height, center_y + half_height
+
+    # bounds are whole cells with a cell of margin, so small pans share one view
+    bounds = (int(np.floor(west / cell_size)) - 1, int(np.floor(south / cell_size)) - 1,
+              int(np.floor(east / cell_size)) + 1, int(np.floor(north / cell_size)) + 1)
+    return zoom_level, bounds
+
+
+def get_map_clusters(mapping_data: list, columns: dict, view: tuple) -> dict:
+    zoom_level, (west, south, east, north) = view
+    cell_size = get_cell_size(zoom_level=zoom_level)
+    cells_x = np.floor(columns['long'] / cell_size).astype('int64')
+    cells_y = np.floor(get_mercator_y(columns['lat']) / cell_size).astype('int64')
+
+    visible = (south <= cells_y) & (cells_y <= north)
+    if (east - west + 1) * cell_size < 360:
+        visible &= (columns['long'] - west * cell_size) % 360 < (east - west + 1) * cell_size
+    columns = {name: column[visible] for name, column in columns.items()}
+    cells = cells_x[visible] * 2 ** 32 + cells_y[visible]
+
+    _, first, inverse, counts = np.unique(cells, return_index=True, return_inverse=True,
+                                          return_counts=True)
+    weights = np.maximum(columns['users_count'], 1)
+    weights_sum = np.bincount(inverse, weights=weights)
+    users_count = np.bincount(inverse, weights=columns['users_count']).round().astype('int64')
+
+    # only cities alone in their cell are named, the others are summed up
+    text = np.empty(len(counts), dtype=object)
+    text[counts == 1] = get_map_text(mapping_data=[
+        mapping_data[row] for row in np.flatnonzero(visible)[first[counts == 1]].tolist()
+    ])
+    text[counts > 1] = [f'Cities: {cities}<br>Count visitors: {users}' for cities, users
+                        in zip(counts[counts > 1].tolist(), users_count[counts > 1].tolist())]
+    return {
+        'text': text,
+        'lat': (np.bincount(inverse, weights=weights * columns['lat']) / weights_sum).round(5),
+        'long': (np.bincount(inverse, weights=weights * columns['long']) / weights_sum).round(5),
+        'users_count': users_count,
+    }
+
+
+def scattergeo_figure_regions_map(mapping_data: list, view: tuple = None) -> dict:
+    columns = get_map_columns(mapping_data=mapping_data)
+    if view is None:
+        columns['text'] = get_map_text(mapping_data=mapping_data)
+    else:
+        columns = get_map_clusters(mapping_data=mapping_data, columns=columns, view=view)
+    limits = get_limits_params_for_map(counts_users=columns['users_count'])
+
+    buckets = np.digitize(columns['users_count'], [lim[0] for lim in limits]) - 1
+    order = np.argsort(buckets, kind='stable')
+    bounds = np.searchsorted(buckets[order], np.arange(len(limits) + 1))
+
+    data = []
+    for i, lim in enumerate(limits):
+        if lim != limits[-1]:
+            name = f'{lim[0]} - {lim[1]}'
+        else:
+            name = f'{lim[0]} <'
+        rows = order[bounds[i]:bounds[i + 1]]
+
+        data.append({
+            'type': 'scattermapbox',
+            'lat': columns['lat'][rows],
+            'lon': columns['long'][rows],
+            'text': columns['text'][rows],
+            'name': name,
+            'mode': 'markers',
+            'marker': {
+                'size': 2 * 45 / lim[2] ** 2,
+                'color': COLORS_OF_CITIES_ON_MAP[i],
+                'sizemode': 'area',
+            },
+        })
+
+    return {
+        'data': data,
+        'layout': get_layout(
+            title_text='regions_map',
+            margin={'l': 0, 't': 40, 'b': 0, 'r': 0},
+            mapbox={
+                'center': MAP_DEFAULT_CENTER,
+                'style': 'stamen-terrain',
+                'zoom': MAP_DEFAULT_ZOOM,
+            },
+            uirevision='regions_map',
+        ),
+    }
+
+
+def get_limits_params_for_map(counts_users) -> list:
+    counts_users = np.unique(counts_users)
+    if not len(counts_users):
+        return []
+    len_diapason = len(counts_users) // len(RADIUS_OF_CITIES_ON_MAP) + 1
+    if len_diapason == 1:
+        # fewer counts than radii, every city gets the largest marker
+        return [[counts_users[0].item(), counts_users[0].item(), RADIUS_OF_CITIES_ON_MAP[0]]]
+    starts = list(range(0, len(counts_users), len_diapason))
+    ends = starts[1:] + [len(counts_users)]
+    radii = RADIUS_OF_CITIES_ON_MAP[:len(starts)]
+    if len(starts) < len(RADIUS_OF_CITIES_ON_MAP) and ends[-1] - starts[-1] > 1:
+        # the largest count gets a diapason of its own, sized by the next radius
+        starts.append(ends[-1] - 1)
+        ends.insert(-1, ends[-1] - 1)
+        radii = radii[:-1] + [RADIUS_OF_CITIES_ON_MAP[len(starts) - 1]] * 2
+    return [[low, high, radius] for low, high, radius in
+            zip(counts_users[starts].tolist(), counts_users[[end - 1 for end in ends]].tolist(), radii)]
@@ -2,16 +2,16 @@ import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 from dash.dependencies import Output, Input
-import plotly.graph_objects as go
-import pandas as pd
 
 from server import app
-from backend.models import Date, HoursInDay, VisitsCountByHour, Devices, \
-    PageViewsByDevices, TrafficSource, VisitsCountByTrafficSource, RegionsMap
-
-RADIUS_OF_CITIES_ON_MAP = [3, 2.75, 2.25, 2, 1.5]
+from backend.models import Date, get_dashboard_aggregates
+from backend.result_cache import ResultCache, get_data_version
+from pages.figures import bar_figure_visits_count_by_traffic_source, \
+    pie_figure_page_views_by_devices, scatter_figure_visits_count_by_hour, \
+    scattergeo_figure_regions_map, get_map_view
 
 d = Date()
+result_cache = ResultCache()
 
 
 def get_success_alert(start_date: str, end_date: str) -> dbc.Alert:
@@ -29,203 +29,90 @@ def get_danger_alert(date: str) -> dbc.Alert:
     )
 
 
-def bar_figure_visits_count_by_traffic_source(start_date: str, end_date: str) -> go.Figure:
-    visits_count_by_traffic_source = VisitsCountByTrafficSource().get_data_from_joining_models(
-        start_date=start_date,
-        end_date=end_date,
-        select_name_column='visits_count',
-        order_name_column='traffic_source_id',
-        model=TrafficSource
-    )
-
-    fig = go.Figure()
-
-    fig.add_trace(go.Bar(
-        x=[row[0] for row in visits_count_by_traffic_source],
-        y=[row[1] for row in visits_count_by_traffic_source],
-        hovertemplate='%{x}: %{y:.f}<extra></extra>',
-    ))
-
-    fig.update_layout(
-        title_font_size=25, title_x=0.5,
-        title_text='visits_count_by_traffic_source'
-    )
-    return fig
-
-
-def pie_figure_page_views_by_devices(start_date: str, end_date: str) -> (html.H1, go.Figure):
-    page_views_by_devices = PageViewsByDevices().get_data_from_joining_models(
-        start_date=start_date,
-        end_date=end_date,
-        select_name_column='page_views',
-        order_name_column='device_id',
-        model=Devices
-    )
-
-    fig = go.Figure()
-
-    fig.add_trace(go.Pie(
-        labels=[row[0] for row in page_views_by_devices],
-        values=[row[1] for row in page_views_by_devices]
-    ))
-
-    fig.update_traces(
-        hoverinfo='label+percent', textinfo='value',
-        textfont_size=20, marker=dict(line=dict(color='#000000', width=2)))
-
-    fig.update_layout(
-        title_font_size=25, title_x=0.5,
-        title_text='page_views_by_devices'
-    )
-    sum_visits = sum([row[1] for row in page_views_by_devices])
-    count_visits_string = html.H1(f'Count visits: {sum_visits}')
-    return count_visits_string, fig
-
-
-def scatter_figure_visits_count_by_hour(start_date: str, end_date: str) -> go.Figure:
-    visits_count_by_every_hour = VisitsCountByHour().get_data_from_joining_models(
-        start_date=start_date,
-        end_date=end_date,
-        select_name_column='visits_count_by_hour',
-        order_name_column='hour_id',
-        model=HoursInDay
-    )
-
-    fig = go.Figure()
-
-    fig.add_trace(go.Scatter(
-        x=HoursInDay().hours,
-        y=[row[1] for row in visits_count_by_every_hour],
-        mode='markers',
-    ))
-
-    fig.update_layout(
-        xaxis_title=get_title_text(start_date=start_date, end_date=end_date),
-        yaxis_title='Visits',
-        title_font_size=25, title_x=0.5,
-        title_text='visits_count_by_hour'
-    )
-    return fig
+def get_chart_output(name: str, start_date: str, end_date: str, build, view: tuple = None):
+    key = (name, start_date, end_date, get_data_version(), view)
+    output = result_cache.get(key=key)
+    if output is None:
+        start_date, end_date, _ = check_input_date(start_date=start_date, end_date=end_date)
+        rows = get_dashboard_aggregates(start_date=start_date, end_date=end_date, names=[name])[name]
+        output = build(rows, start_date, end_date)
+        result_cache.set(key=key, value=output)
+    return output
 
 
-def get_title_text(start_date: str, end_date: str) -> str:
-    if start_date == end_date:
-        return f'Hours of {start_date}'
+@app.callback(
+    [Output('date-alert', 'children'),
+     Output('row_0', 'style'),
+     Output('row_1', 'style'),
+     Output('row_2', 'style'),
+     Output('row_3', 'style')],
+    [Input('date-picker', 'start_date'),
+     Input('date-picker', 'end_date')])
+def update_date_alert(start_date: str, end_date: str):
+    start_date, end_date, alert = check_input_date(start_date=start_date, end_date=end_date)
+    if alert:
+        date_alert = get_success_alert(start_date=start_date, end_date=end_date)
     else:
-        return f'Hours of {start_date} - {end_date}'
+        date_alert = get_danger_alert(date=start_date)
+    return [
+        date_alert,
+        {'visibility': 'visible'}, {'visibility': 'visible'}, {'visibility': 'visible'}, {'visibility': 'visible'}
+    ]
 
 
-def scattergeo_figure_regions_map(start_date: str, end_date: str) -> go.Figure:
-    mapping_data = RegionsMap().get_list_with_city_name_code_country_coord(
-        start_date=start_date,
-        end_date=end_date
+@app.callback(
+    Output('graph-visits-count-by-hour', 'figure'),
+    [Input('date-picker', 'start_date'),
+     Input('date-picker', 'end_date')])
+def update_visits_count_by_hour(start_date: str, end_date: str):
+    return get_chart_output(
+        name='visits_count_by_hour', start_date=start_date, end_date=end_date,
+        build=lambda rows, start_date, end_date: scatter_figure_visits_count_by_hour(
+            visits_count_by_every_hour=rows, start_date=start_date, end_date=end_date
+        )
     )
 
-    text = 'City: {0}<br>Country index: {1}' \
-           '<br>Count visitors: {2}'
 
-    df = pd.DataFrame({
-        'text': [text.format(row[0], row[1], row[4]) if row[1]
-                 else text.format(row[0], 'not defined', row[4])
-                 for row in mapping_data],
-        'lat': [row[2] for row in mapping_data],
-        'long': [row[3] for row in mapping_data],
-        'users_count': [row[4] for row in mapping_data],
-    })
-
-    fig = go.Figure()
-
-    limits = get_limits_params_for_map(
-        counts_users=list({row[-1] for row in mapping_data})
+@app.callback(
+    [Output('visits-count', 'children'),
+     Output('graph-page-views-by-devices', 'figure')],
+    [Input('date-picker', 'start_date'),
+     Input('date-picker', 'end_date')])
+def update_page_views_by_devices(start_date: str, end_date: str):
+    return get_chart_output(
+        name='page_views_by_devices', start_date=start_date, end_date=end_date,
+        build=lambda rows, start_date, end_date: [
+            html.H1(f'Count visits: {sum([row[1] for row in rows])}'),
+            pie_figure_page_views_by_devices(page_views_by_devices=rows)
+        ]
     )
-    colors = ['royalblue', 'crimson', 'lightseagreen', 'orange', 'black']
 
-    for i, lim in enumerate(limits):
-        if lim != limits[-1]:
-            name = f'{lim[0]} - {lim[1]}'
-            df_sub = df.query('@lim[0] <= users_count <= @lim[1]')
-        else:
-            name = f'{lim[0]} <'
-            df_sub = df[df['users_count'] >= lim[0]]
-
-        fig.add_trace(go.Scattermapbox(
-            lat=df_sub['lat'], lon=df_sub['long'],
-            text=df_sub['text'], name=name,
-            mode='markers',
-            marker=dict(
-                size=2 * 45 / lim[2] ** 2,
-                color=colors[i],
-                sizemode='area'
-            ),
-        ))
 
-    fig.update_layout(
-        title_font_size=25, title_x=0.5,
-        title_text='regions_map',
-        margin={'l': 0, 't': 40, 'b': 0, 'r': 0},
-        mapbox={
-            'center': {'lon': 40, 'lat': 40},
-            'style': 'stamen-terrain',
-            'zoom': 1.5
-        }
+@app.callback(
+    Output('graph-visits-count-by-traffic-source', 'figure'),
+    [Input('date-picker', 'start_date'),
+     Input('date-picker', 'end_date')])
+def update_visits_count_by_traffic_source(start_date: str, end_date: str):
+    return get_chart_output(
+        name='visits_count_by_traffic_source', start_date=start_date, end_date=end_date,
+        build=lambda rows, start_date, end_date: bar_figure_visits_count_by_traffic_source(
+            visits_count_by_traffic_source=rows
+        )
     )
-    return fig
-
-
-def get_limits_params_for_map(counts_users: list) -> list:
-    counts_users.sort(key=lambda x: x)
-    len_diapason = len(counts_users) // len(RADIUS_OF_CITIES_ON_MAP) + 1
-    limits = []
-    start = 0
-    for i in RADIUS_OF_CITIES_ON_MAP:
-        diapason = counts_users[start:] if start + len_diapason >= len(counts_users) \
-            else counts_users[start:start + len_diapason]
-        l_diapason = len(diapason)
-        if l_diapason == 1:
-            limits.append([diapason[0], diapason[0], i])
-            break
-        elif l_diapason == 0:
-            diapason = counts_users[start - len_diapason:-1]
-            limits[-1] = [diapason[0], diapason[-1], i]
-            limits.append([counts_users[-1], counts_users[-1], i])
-            break
-        else:
-            limits.append([diapason[0], diapason[-1], i])
-        start += len_diapason
-    return limits
 
 
 @app.callback(
-    [Output('date-alert', 'children'),
-     Output('visits-count', 'children'),
-     Output('graph-visits-count-by-hour', 'figure'),
-     Output('graph-page-views-by-devices', 'figure'),
-     Output('graph-visits-count-by-traffic-source', 'figure'),
-     Output('graph-regions_map', 'figure'),
-     Output('row_0', 'style'),
-     Output('row_1', 'style'),
-     Output('row_2', 'style'),
-     Output('row_3', 'style')],
+    Output('graph-regions_map', 'figure'),
     [Input('date-picker', 'start_date'),
-     Input('date-picker', 'end_date')])
-def update_output(start_date: str, end_date: str):
-    start_date, end_date, alert = check_input_date(start_date=start_date, end_date=end_date)
-    scatter = scatter_figure_visits_count_by_hour(start_date=start_date, end_date=end_date)
-    all_visits, pie = pie_figure_page_views_by_devices(start_date=start_date, end_date=end_date)
-    bar = bar_figure_visits_count_by_traffic_source(start_date=start_date, end_date=end_date)
-    scattergeo = scattergeo_figure_regions_map(start_date=start_date, end_date=end_date)
-    if alert:
-        return [
-            get_success_alert(
-                start_date=start_date, end_date=end_date
-            ), all_visits, scatter, pie, bar, scattergeo,
-            {'visibility': 'visible'}, {'visibility': 'visible'}, {'visibility': 'visible'}, {'visibility': 'visible'}
-        ]
-    else:
-        return [
-            get_danger_alert(date=start_date), all_visits, scatter, pie, bar, scattergeo,
-            {'visibility': 'visible'}, {'visibility': 'visible'}, {'visibility': 'visible'}, {'visibility': 'visible'}
-        ]
+     Input('date-picker', 'end_date'),
+     Input('graph-regions_map', 'relayoutData')])
+def update_regions_map(start_date: str, end_date: str, relayout_data: dict):
+    view = get_map_view(relayout_data=relayout_data)
+    return get_chart_output(
+        name='regions_map', start_date=start_date, end_date=end_date, view=view,
+        build=lambda rows, start_date, end_date: scattergeo_figure_regions_map(mapping_data=rows,
+                                                                               view=view)
+    )
 
 
 def check_input_date(start_date: str, end_date: str) -> list:
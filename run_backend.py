@@ -1,14 +1,41 @@
+from argparse import ArgumentParser
+
 try:
+    from backend.daemon import IngestionDaemon
     from backend.main import Worker
-    from backend.models import Users
+    from backend.models import db, init_db, Users
+    from backend.settings import BACKFILL_PROCESSES, REFRESH_INTERVAL_SECONDS
 except ImportError:
     exit('copy settings.py.default->settings.py and '
          'set TOKEN, TOKEN_MAP and SECRET_KEY_SERVER')
 
 
+def parse_args():
+    parser = ArgumentParser(description='Load Yandex.Metrica data to DB')
+    parser.add_argument('--days', type=int, default=1,
+                        help='count of last days to load, yesterday by default')
+    parser.add_argument('--backfill', action='store_true',
+                        help='load days by date ranges instead of one day at a time')
+    parser.add_argument('--processes', type=int, default=BACKFILL_PROCESSES,
+                        help='processes fetching date ranges in backfill mode')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running and refresh the current day on an interval')
+    parser.add_argument('--interval', type=int, default=REFRESH_INTERVAL_SECONDS,
+                        help='seconds between refreshes in daemon mode')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    u = Users()
-    if not u.check_exists_admin_user:
-        u.insert_default_values()
-    t = Worker()
-    t.run(delta_days=1)
+    args = parse_args()
+    init_db()
+    with db.connection_context():
+        u = Users()
+        if not u.check_exists_admin_user:
+            u.insert_default_values()
+        t = Worker()
+        if args.daemon:
+            IngestionDaemon(interval=args.interval).run()
+        elif args.backfill:
+            t.backfill(delta_days=args.days, processes=args.processes)
+        else:
+            t.run(delta_days=args.days)
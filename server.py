@@ -7,9 +7,9 @@ from flask_peewee.admin import Admin
 # from flask_peewee.rest import RestAPI
 
 
-from backend.models import Cities, Date, Devices, HoursInDay, PageViewsByDevices, \
+from backend.models import db, init_db, Cities, Date, Devices, HoursInDay, PageViewsByDevices, \
     RegionsMap, TrafficSource, VisitsCountByHour, VisitsCountByTrafficSource, Users
-from backend.settings import DB_NAME, SECRET_KEY_SERVER
+from backend.settings import SECRET_KEY_SERVER
 
 if not SECRET_KEY_SERVER:
     exit('SECRET_KEY_SERVER has to be not NULL, set value!')
@@ -25,16 +25,14 @@ app.config.suppress_callback_exceptions = True
 app.title = 'Test Dash Project'
 
 server = app.server
-DATABASE = {
-    'name': DB_NAME,
-    'engine': 'peewee.SqliteDatabase',
-}
 SECRET_KEY = SECRET_KEY_SERVER
 server.config.from_object(__name__)
 
-db = DataBase(server)
+init_db()
+# connects the shared backend.models.db before every request and closes it after
+database = DataBase(app=server, database=db)
 
-auth = Auth(app=server, db=db, user_model=Users)
+auth = Auth(app=server, db=database, user_model=Users)
 
 admin = Admin(app=server, auth=auth)
 admin.register(model=Cities)
@@ -0,0 +1,51 @@
+import os
+from tempfile import TemporaryDirectory
+
+import pytest
+
+import backend.settings as settings
+from benchmarks.fake_server import FakeMetricaServer, METRICA_PATH, GEOCODER_PATH, \
+    make_synthetic_rows
+
+TMP_DIR = TemporaryDirectory()
+CITIES = 20
+
+server = FakeMetricaServer(reports={
+    query['dimensions']: make_synthetic_rows(dimensions=query['dimensions'], cities=CITIES)
+    for query in settings.CASES_OF_MODEL_QUERY.values()
+}, miss_ratio=0)
+server.start()
+
+settings.DB_NAME = os.path.join(TMP_DIR.name, 'test.db')
+settings.URL = f'{server.url}{METRICA_PATH}'
+settings.URL_MAP = f'{server.url}{GEOCODER_PATH}?format=json&geocode={{0}}'
+settings.METRICA_REQUESTS_PER_SECOND = 1000
+settings.GEOCODER_REQUESTS_PER_SECOND = 1000
+settings.REQUESTS_RETRIES = 0
+settings.COLUMNAR_CACHE_DIR = ''
+settings.FACT_STORAGE = 'sqlite'
+settings.RESULT_CACHE_DIR = os.path.join(TMP_DIR.name, 'result_cache')
+settings.RETENTION_DAYS = 0
+
+
+@pytest.fixture
+def fake_server() -> FakeMetricaServer:
+    yield server
+    server.failing_reports.clear()
+    server.report_errors = ''
+    server.geocoder_status = 200
+
+
+@pytest.fixture
+def database():
+    from backend.models import db, init_db, DimensionResolver
+
+    db.close()
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(f'{settings.DB_NAME}{suffix}'):
+            os.remove(f'{settings.DB_NAME}{suffix}')
+    DimensionResolver.reset()
+    init_db()
+    yield db
+    db.close()
+    DimensionResolver.reset()
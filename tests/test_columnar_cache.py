@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+import pytest
+
+import backend.columnar_cache as columnar_cache
+from backend.models import Cities, Date, IngestionLedger, RegionsMap
+
+pytest.importorskip('numpy')
+
+DATES = [date(2020, 3, 1) + timedelta(days=i) for i in range(5)]
+
+
+def test_cities_sharing_coordinates_are_one_row(database, monkeypatch, tmp_path):
+    Cities.insert_many([
+        (1, 'Springfield', 'RU', 40.47, 58.43),
+        (2, 'Springfield', 'RU', 40.47, 58.43),
+        (3, 'Springfield', 'RU', 40.47, 58.43),
+        (4, 'Shelbyville', 'RU', 41.5, 59.1),
+    ], fields=Cities().fields_without_id).execute()
+    city_ids = [city_id for city_id, in Cities.select(Cities.id).tuples()]
+    date_ids = Date().get_ids(dates=DATES)
+    rows = [(date_id, city_id, date_id % 100 + city_id)
+            for date_id in date_ids.values() for city_id in city_ids]
+    RegionsMap.insert_many(rows, fields=RegionsMap().fields_without_id).execute()
+    RegionsMap().update_rollups(dates=DATES)
+    IngestionLedger().finish_reports(report=RegionsMap.__name__, rows_count_by_date_id={
+        date_id: len(city_ids) for date_id in date_ids.values()
+    })
+    expected = RegionsMap().get_list_with_city_name_code_country_coord(
+        start_date=f'{DATES[0]}', end_date=f'{DATES[-1]}'
+    )
+
+    monkeypatch.setattr(columnar_cache, 'COLUMNAR_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(columnar_cache.ColumnarCache, 'caches', {})
+    cache = columnar_cache.ColumnarCache.of(fact_model=RegionsMap)
+    cache.update(dates=DATES)
+    rows = cache.get_rows(start_date=f'{DATES[0]}', end_date=f'{DATES[-1]}')
+
+    assert len(expected) == 2
+    assert rows == sorted(expected)
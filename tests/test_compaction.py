@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+
+import backend.models as models
+from backend.main import Worker
+from backend.models import Date, Devices, PageViewsByDevices
+from backend.settings import CASES_OF_MODEL_QUERY
+
+
+def get_page_views(start_date: date, end_date: date) -> list:
+    return PageViewsByDevices().get_data_from_joining_models(
+        start_date=f'{start_date}', end_date=f'{end_date}', select_name_column='page_views',
+        order_name_column='device_id', model=Devices
+    )
+
+
+def test_retry_of_first_day_after_compaction(database, fake_server, monkeypatch):
+    today = date.today()
+    cutoff = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+    month_end = cutoff - timedelta(days=1)
+    month_start = month_end.replace(day=1)
+    delta_days = (today - month_start).days
+
+    fake_server.failing_reports.add(
+        (CASES_OF_MODEL_QUERY['PageViewsByDevices']['dimensions'], month_start)
+    )
+    Worker().run(delta_days=delta_days)
+    fake_server.failing_reports.clear()
+
+    monkeypatch.setattr(models, 'RETENTION_DAYS', (today - cutoff).days)
+    Worker().compact()
+    compacted = get_page_views(start_date=month_start, end_date=month_end)
+    month_condition = PageViewsByDevices.date_id.between(Date.get_key(month_start),
+                                                         Date.get_key(month_end))
+    assert compacted
+    assert PageViewsByDevices.select().where(month_condition).count() == len(compacted)
+
+    Worker().run(delta_days=delta_days)
+    assert get_page_views(start_date=month_start, end_date=month_end) == compacted
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+from backend.models import Date, Devices, PageViewsByDevices
+
+START_DATE = date(2020, 3, 1)
+DEVICES = ['desktop', 'mobile', 'tablet']
+
+
+def load_days(dates: list):
+    date_ids = Date().get_ids(dates=dates)
+    for date_id in date_ids.values():
+        PageViewsByDevices().add_metric_rows(date_id=date_id, metric_data=[
+            {'dimensions': [{'id': device, 'name': device.title()}],
+             'metrics': [date_id % 100 * 10 + i]}
+            for i, device in enumerate(DEVICES)
+        ])
+    PageViewsByDevices().update_rollups(dates=dates)
+    PageViewsByDevices().update_cumulative(dates=dates)
+
+
+def get_expected(start_date: date, end_date: date) -> list:
+    query = Devices.select(Devices.name, PageViewsByDevices.page_views).\
+        join(PageViewsByDevices, on=PageViewsByDevices.device_id == Devices.id).\
+        where(PageViewsByDevices.date_id.between(Date.get_key(start_date), Date.get_key(end_date)))
+    totals = {}
+    for name, page_views in query.tuples():
+        totals[name] = totals.get(name, 0) + page_views
+    return sorted(totals.items())
+
+
+def get_range_totals(start_date: date, end_date: date) -> list:
+    totals = PageViewsByDevices().select_range_totals(start_date=f'{start_date}',
+                                                      end_date=f'{end_date}')
+    query = Devices.select(Devices.name, totals.c.metric).\
+        join(totals, on=totals.c.dimension_id == Devices.id).order_by(Devices.name)
+    return list(query.tuples())
+
+
+def test_range_totals_around_gap(database):
+    first_days = [START_DATE + timedelta(days=i) for i in range(10)]
+    last_days = [START_DATE + timedelta(days=i) for i in range(20, 30)]
+    load_days(dates=first_days)
+    load_days(dates=last_days)
+
+    ranges = [
+        (START_DATE + timedelta(days=12), START_DATE + timedelta(days=16)),
+        (START_DATE + timedelta(days=10), START_DATE + timedelta(days=19)),
+        (START_DATE + timedelta(days=5), START_DATE + timedelta(days=14)),
+        (START_DATE + timedelta(days=15), START_DATE + timedelta(days=24)),
+        (START_DATE + timedelta(days=5), START_DATE + timedelta(days=24)),
+        (START_DATE, START_DATE + timedelta(days=29)),
+    ]
+    for start_date, end_date in ranges:
+        assert get_range_totals(start_date=start_date, end_date=end_date) == \
+            get_expected(start_date=start_date, end_date=end_date), (start_date, end_date)
+
+
+def test_range_totals_past_data(database):
+    load_days(dates=[START_DATE + timedelta(days=i) for i in range(10)])
+
+    for start_date, end_date in [(START_DATE + timedelta(days=12), START_DATE + timedelta(days=16)),
+                                 (START_DATE + timedelta(days=10), START_DATE + timedelta(days=10)),
+                                 (START_DATE - timedelta(days=9), START_DATE - timedelta(days=1))]:
+        assert get_range_totals(start_date=start_date, end_date=end_date) == []
+        assert PageViewsByDevices().get_data_from_joining_models(
+            start_date=f'{start_date}', end_date=f'{end_date}', select_name_column='page_views',
+            order_name_column='device_id', model=Devices
+        ) == []
@@ -0,0 +1,35 @@
+from datetime import date, datetime, timedelta
+
+from backend.main import Worker
+from backend.models import Date, IngestionLedger
+from backend.settings import CASES_OF_MODEL_QUERY
+
+REPORTS = list(CASES_OF_MODEL_QUERY)
+
+
+def get_days_ago(*days: int) -> list:
+    return [date.today() - timedelta(days=i) for i in days]
+
+
+def set_loaded_intraday(dates: list):
+    for date_work in dates:
+        IngestionLedger.update(finished_at=datetime.combine(date_work, datetime.min.time())).\
+            where(IngestionLedger.date_id == Date.get_key(date_work)).execute()
+
+
+def test_new_database_finalizes_yesterday(database):
+    assert IngestionLedger().get_unfinished_dates(reports=REPORTS, end_date=date.today()) == \
+        get_days_ago(1)
+
+
+def test_days_loaded_intraday_and_missed_days_are_finalized(database):
+    Worker().run(delta_days=6)
+    set_loaded_intraday(dates=get_days_ago(5, 3))
+    Date.delete().where(Date.date.in_([f'{date_work}' for date_work in get_days_ago(2, 1)])).execute()
+    assert IngestionLedger().get_unfinished_dates(reports=REPORTS, end_date=date.today()) == \
+        get_days_ago(5, 3, 2, 1)
+
+    Worker().finalize()
+    assert IngestionLedger().get_unfinished_dates(reports=REPORTS, end_date=date.today()) == []
+    date_ids = list(Date().get_ids(dates=get_days_ago(6, 5, 4, 3, 2, 1)).values())
+    assert len(IngestionLedger().get_finished_reports(date_ids=date_ids)) == 6 * len(REPORTS)
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+import pytest
+
+from backend.main import Worker
+from backend.models import Cities, Date, GeocodingCache, IngestionLedger, RegionsMap
+from backend.request_handlers.requester import RequestFailed
+from backend.settings import CASES_OF_MODEL_QUERY
+from tests.conftest import CITIES
+
+METRIC_DATA = [{'dimensions': [{'id': city, 'name': f'City-{city}', 'iso_name': 'RU-MOW'}],
+                'metrics': [1]} for city in range(1, 6)]
+
+
+def test_failed_lookups_are_not_cached(database, fake_server):
+    fake_server.geocoder_status = 403
+    with pytest.raises(RequestFailed):
+        RegionsMap().prepare_metric_data(metric_data=METRIC_DATA)
+    assert GeocodingCache.select().count() == 0
+    assert Cities.select().count() == 0
+
+    fake_server.geocoder_status = 200
+    RegionsMap().prepare_metric_data(metric_data=METRIC_DATA)
+    assert GeocodingCache.select().count() == len(METRIC_DATA)
+    assert Cities.select().where(Cities.lat != 0).count() == len(METRIC_DATA)
+
+
+@pytest.mark.parametrize('load', [
+    lambda delta_days: Worker().run(delta_days=delta_days),
+    lambda delta_days: Worker().backfill(delta_days=delta_days, processes=2),
+], ids=['run', 'backfill in processes'])
+def test_failed_geocoding_fails_regions_map_only(database, fake_server, load):
+    delta_days = 3
+    fake_server.geocoder_status = 403
+    load(delta_days)
+    date_ids = list(Date().get_ids(dates=[date.today() - timedelta(days=i)
+                                          for i in range(delta_days, 0, -1)]).values())
+    finished_reports = IngestionLedger().get_finished_reports(date_ids=date_ids)
+    assert {report for _, report in finished_reports} == \
+        set(CASES_OF_MODEL_QUERY) - {RegionsMap.__name__}
+    assert len(finished_reports) == delta_days * (len(CASES_OF_MODEL_QUERY) - 1)
+    assert RegionsMap.select().count() == 0
+
+    fake_server.geocoder_status = 200
+    Worker().run(delta_days=delta_days)
+    finished_reports = IngestionLedger().get_finished_reports(date_ids=date_ids)
+    assert len(finished_reports) == delta_days * len(CASES_OF_MODEL_QUERY)
+    assert RegionsMap.select().count() == delta_days * CITIES
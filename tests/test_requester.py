@@ -0,0 +1,16 @@
+import pytest
+
+from backend.request_handlers.requester import Requester, RequestFailed
+
+
+def test_failed_status_raises(fake_server):
+    with pytest.raises(RequestFailed, match='status code 404'):
+        Requester().get(url=f'{fake_server.url}/unknown')
+
+
+def test_report_with_failed_page_raises(fake_server):
+    fake_server.report_errors = 'Wrong parameter: dimensions'
+    with pytest.raises(RequestFailed, match='Wrong parameter: dimensions'):
+        list(Requester().get_pages(url=f'{fake_server.url}/stat/v1/data', page_size=10, params={
+            'dimensions': 'ym:s:deviceCategory', 'date1': '2020-01-01', 'date2': '2020-01-01'
+        }))